@@ -1,13 +1,11 @@
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from main_analysis import fetch_stock_data
+from main_analysis import MAX_WORKERS, fetch_stock_data, fetch_many_stock_data, load_portfolio
 import tech_analysis_tools
-from sklearn.linear_model import LinearRegression
 import numpy as np
 import argparse
-
-# Load portfolio data from Excel
-portfolio_data = pd.read_excel('portfolio.xlsx')
+import market_data
 
 def calculate_fibonacci_levels(data):
     high = data['High'].max()
@@ -35,14 +33,42 @@ def calculate_rsi(data, window=14):
     data['RSI'] = rsi
     return data
 
+def fit_trendlines(vwaps, days):
+    """
+    Least-squares line through the last `days` VWAP values of every symbol at once, projected
+    over the next `days` periods.
+
+    :param vwaps: List of VWAP arrays, one per symbol. A symbol with fewer than `days` values is
+                  fitted on the values it has, at the end of the window.
+    :return: Arrays of slopes and intercepts (one per symbol) and the predictions, one row per symbol.
+    """
+    # Right-align the windows in one matrix, missing values as NaN
+    window = np.full((len(vwaps), days), np.nan)
+    for row, vwap in enumerate(vwaps):
+        values = np.asarray(vwap, dtype=float)[-days:]
+        if len(values):
+            window[row, days - len(values):] = values
+
+    valid = ~np.isnan(window)
+    x = np.where(valid, np.arange(days, dtype=float), 0.0)
+    y = np.where(valid, window, 0.0)
+
+    # Closed form of the one-variable regression, over the valid values of each row
+    with np.errstate(divide='ignore', invalid='ignore'):
+        count = valid.sum(axis=1)
+        x_mean = x.sum(axis=1) / count
+        y_mean = y.sum(axis=1) / count
+        x_centered = np.where(valid, x - x_mean[:, None], 0.0)
+        y_centered = np.where(valid, y - y_mean[:, None], 0.0)
+        slopes = (x_centered * y_centered).sum(axis=1) / (x_centered ** 2).sum(axis=1)
+    intercepts = y_mean - slopes * x_mean
+
+    predictions = intercepts[:, None] + slopes[:, None] * np.arange(days, 2 * days)
+    return slopes, intercepts, predictions
+
 def apply_trendline(data, days):
-    y = data['VWAP'].values[-days:]
-    x = np.arange(days).reshape(-1, 1)
-    model = LinearRegression().fit(x, y)
-    slope = model.coef_[0]
-    intercept = model.intercept_
-    trendline_prediction = [(slope * i + intercept) for i in range(days, days + PREDICTION_DAYS)]
-    return slope, intercept, trendline_prediction
+    slopes, intercepts, predictions = fit_trendlines([data['VWAP'].values], days)
+    return slopes[0], intercepts[0], list(predictions[0])
 
 def weighted_average_prediction(vwap, vwap_ema, trendline_prediction, vwap_weight=0.2, ema_weight=0.5, trendline_weight=0.3):
     return (vwap_weight * vwap) + (ema_weight * vwap_ema) + (trendline_weight * np.mean(trendline_prediction))
@@ -51,51 +77,64 @@ def calculate_volatility(data, days=30):
     recent_data = data['Close'][-days:]
     return recent_data.std()
 
-def analyze_historical_data(symbol, start_date, end_date, interval):
-    historical_data = fetch_stock_data(symbol, start_date, end_date, interval)
-
-    if historical_data.empty:
-        print(f"No historical data found for {symbol}")
-        return None
-
-    # Calculate VWAP for historical data
+def add_indicators(historical_data):
+    # VWAP, VWAP_EMA and RSI columns, computed once per symbol
     historical_data['VWAP'] = tech_analysis_tools.calculate_vwap(historical_data)
-
-    # Apply technical indicators
     historical_data = calculate_vwap_ema(historical_data)
     historical_data = calculate_rsi(historical_data)
-    fibonacci_levels = calculate_fibonacci_levels(historical_data)
-    
-    return historical_data, fibonacci_levels
+    return historical_data
 
-def predict_next_period(symbol, start_date, end_date, interval):
-    historical_data = fetch_stock_data(symbol, start_date, end_date, interval)
+def analyze_historical_data(symbol, start_date, end_date, interval, historical_data=None):
+    # historical_data: bars already fetched for symbol
+    if historical_data is None:
+        historical_data = fetch_stock_data(symbol, start_date, end_date, interval)
 
     if historical_data.empty:
         print(f"No historical data found for {symbol}")
         return None
 
-    # Calculate VWAP and other indicators
-    historical_data['VWAP'] = tech_analysis_tools.calculate_vwap(historical_data)
-    historical_data = calculate_vwap_ema(historical_data)
-    historical_data = calculate_rsi(historical_data)
-    slope, intercept, trendline_prediction = apply_trendline(historical_data, days=PREDICTION_DAYS)
-    avg_trendline = np.mean(trendline_prediction)
-
-    # Get final prediction as a weighted average
-    vwap_ema = historical_data['VWAP_EMA'].iloc[-1]
-    vwap = historical_data['VWAP'].iloc[-1]
-    prediction = weighted_average_prediction(vwap, vwap_ema, trendline_prediction)
+    historical_data = add_indicators(historical_data)
+    fibonacci_levels = calculate_fibonacci_levels(historical_data)
 
-    # Calculate confidence interval based on recent volatility
-    volatility = calculate_volatility(historical_data)
-    confidence_interval = (prediction - volatility, prediction + volatility)
+    return historical_data, fibonacci_levels
 
-    return prediction, confidence_interval, slope
+def predict_next_periods(analyzed, days):
+    """
+    Predicted average VWAP over the next `days` periods for every analyzed symbol, with one
+    trendline fit for all of them.
+
+    :param analyzed: Dict of symbol -> historical data with the indicator columns (see add_indicators).
+    :return: Dict of symbol -> (prediction, confidence interval, slope).
+    """
+    symbols = list(analyzed)
+    slopes, _, predictions = fit_trendlines([analyzed[symbol]['VWAP'].values for symbol in symbols], days)
+
+    results = {}
+    for symbol, slope, trendline_prediction in zip(symbols, slopes, predictions):
+        historical_data = analyzed[symbol]
+
+        # Get final prediction as a weighted average
+        vwap_ema = historical_data['VWAP_EMA'].iloc[-1]
+        vwap = historical_data['VWAP'].iloc[-1]
+        prediction = weighted_average_prediction(vwap, vwap_ema, trendline_prediction)
+
+        # Calculate confidence interval based on recent volatility
+        volatility = calculate_volatility(historical_data)
+        results[symbol] = (prediction, (prediction - volatility, prediction + volatility), slope)
+    return results
+
+def predict_next_period(symbol, start_date, end_date, interval, days=20, historical_data=None):
+    analysis = analyze_historical_data(symbol, start_date, end_date, interval, historical_data)
+    if analysis is None:
+        return None
+    return predict_next_periods({symbol: analysis[0]}, days)[symbol]
 
-def main(prediction_days):
-    global PREDICTION_DAYS
-    PREDICTION_DAYS = prediction_days  # Set the global prediction days variable
+def main(prediction_days, max_workers=MAX_WORKERS):
+    """
+    :param prediction_days: Prediction horizons in days, a list or a single value.
+    """
+    if isinstance(prediction_days, int):
+        prediction_days = [prediction_days]
 
     today = datetime.now() + timedelta(days=1)
     end_date = today.strftime("%Y-%m-%d")
@@ -104,30 +143,61 @@ def main(prediction_days):
 
     print(f"\nDate range: {start_date} to {end_date} and {interval} chart")
 
-    for index, row in portfolio_data.iterrows():
-        symbol = row['Symbol']
+    portfolio_data = load_portfolio()
+    symbols = portfolio_data['Symbol'].tolist()
+
+    # Every symbol is fetched once (missing bars come from one batched download)
+    try:
+        stock_data = fetch_many_stock_data(symbols, start_date, end_date, interval, max_workers=max_workers)
+    except Exception as e:
+        print(f"Could not fetch portfolio data: {e}")
+        return
+
+    # One indicator pass per symbol, the symbols in parallel
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            symbol: executor.submit(analyze_historical_data, symbol, start_date, end_date, interval,
+                                    stock_data.get(symbol, pd.DataFrame()))
+            for symbol in symbols
+        }
+    analyses = {}
+    for symbol, future in futures.items():
+        try:
+            analyses[symbol] = future.result()
+        except Exception as e:
+            print(f"Could not analyze {symbol}: {e}")
+            analyses[symbol] = None
+
+    analyzed = {symbol: analysis[0] for symbol, analysis in analyses.items() if analysis is not None}
+    predictions = {days: predict_next_periods(analyzed, days) for days in prediction_days} if analyzed else {}
+
+    for symbol in symbols:
         print(f"\nHistorical data for {symbol}:")
 
-        historical_data, fibonacci_levels = analyze_historical_data(symbol, start_date, end_date, interval)
+        if analyses[symbol] is None:
+            print(f"Could not analyze historical data for {symbol}")
+            continue
 
-        if historical_data is not None:
-            current_vwap = historical_data['VWAP'].iloc[-1]
-            predicted_vwap, confidence_interval, slope = predict_next_period(symbol, start_date, end_date, interval)
+        historical_data, fibonacci_levels = analyses[symbol]
+        current_vwap = historical_data['VWAP'].iloc[-1]
+        current_price = historical_data['Close'].iloc[-1]
+        print(f"Current Price: ${current_price:.2f}")
 
-            current_price = historical_data['Close'].iloc[-1]
-            print(f"Current Price: ${current_price:.2f}")
-            print(f"Current VWAP: {current_vwap:.2f} (Predicted AVG. VWAP next {PREDICTION_DAYS} days: {predicted_vwap:.2f})")
+        for days in prediction_days:
+            predicted_vwap, confidence_interval, slope = predictions[days][symbol]
+            print(f"Current VWAP: {current_vwap:.2f} (Predicted AVG. VWAP next {days} days: {predicted_vwap:.2f})")
             print(f"Confidence Interval: ({confidence_interval[0]:.2f}, {confidence_interval[1]:.2f})")
             print(f"Slope of trendline: {slope:.4f}")
 
-            for level, price in fibonacci_levels.items():
-                print(f"Fibonacci Level {level}: ${price:.2f} - {'Price is bullish' if current_vwap < price else 'Price is bearish'}")
-        else:
-            print(f"Could not analyze historical data for {symbol}")
+        for level, price in fibonacci_levels.items():
+            print(f"Fibonacci Level {level}: ${price:.2f} - {'Price is bullish' if current_vwap < price else 'Price is bearish'}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Stock Prediction Analysis')
-    parser.add_argument('--days', type=int, default=20, help='Number of days for prediction (default: 20)')
+    parser.add_argument('--days', type=int, nargs='+', default=[20], help='Number of days for prediction, several values for several horizons (default: 20)')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help=f'Symbols processed at the same time (default: {MAX_WORKERS})')
+    market_data.add_arguments(parser)
     args = parser.parse_args()
-    
-    main(args.days)
+
+    market_data.configure(args.replay, args.latency, args.jitter)
+    main(args.days, args.workers)
@@ -1,10 +1,19 @@
 import argparse
-from bayes_opt import BayesianOptimization
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import main_analysis
+import numpy as np
+import pandas as pd
+import profiling
 from datetime import datetime, timedelta
 
+# bayes_opt is imported by the optimization functions only, backtests do not need it
 
-def backtest(ticker, start_date, end_date, interval, weights, profit_threshold=0.05, stop_loss_threshold=0.03):
+
+def backtest(ticker, start_date, end_date, interval, weights, profit_threshold=0.05, stop_loss_threshold=0.03, engine='single_pass',
+             lean=False, dtype=None):
     # Fetch stock data
     data = main_analysis.fetch_stock_data(ticker, start_date, end_date, interval, progress=False)
 
@@ -12,6 +21,65 @@ def backtest(ticker, start_date, end_date, interval, weights, profit_threshold=0
         print(f"No data found for {ticker}")
         return None
 
+    return run_backtest(data, weights, profit_threshold, stop_loss_threshold, engine, lean, dtype)
+
+
+def run_backtest(data, weights, profit_threshold=0.05, stop_loss_threshold=0.03, engine='single_pass', lean=False, dtype=None):
+    """
+    Backtest already downloaded data.
+
+    :param engine: 'single_pass' computes every indicator once over the whole series (linear in bars),
+                   'prefix' re-runs analyze_stock on every prefix of the data (the original quadratic loop).
+    :param lean: Memory-lean prefix engine: no copy of every prefix and no columns added to it.
+    :param dtype: Float type the single pass engine keeps the indicator values as, np.float32 to halve them.
+                  Values near a threshold can round the other way, so decisions may differ from float64.
+    """
+    with profiling.stage(f'backtest {engine} decisions'):
+        if engine == 'prefix':
+            decisions = prefix_decisions(data, weights, lean)
+        elif engine == 'single_pass':
+            decisions = single_pass_decisions(data, weights, dtype)
+        else:
+            raise ValueError(f"Unknown backtest engine: {engine}")
+
+    with profiling.stage('backtest trades'):
+        return simulate_trades(data, decisions, profit_threshold, stop_loss_threshold)
+
+
+def prefix_decisions(data, weights, lean=False):
+    """
+    Decision for every bar obtained by running analyze_stock on data.iloc[:i+1].
+    Kept as the reference implementation for compare_engines.
+
+    :param lean: Pass analyze_stock a slice of data instead of a copy, with lean=True so it adds no columns.
+    """
+    decisions = [None] * len(data)
+    for i in range(len(data)):
+        if i < 1:
+            continue  # analyze_stock needs at least two bars
+
+        if lean:
+            analysis = main_analysis.analyze_stock(data.iloc[:i+1], weights, lean=True)
+        else:
+            subset_data = data.iloc[:i+1].copy()  # Current subset of data up to the current date
+            analysis = main_analysis.analyze_stock(subset_data, weights)
+        decisions[i] = analysis['Decision']
+
+    return decisions
+
+
+def single_pass_decisions(data, weights, dtype=None):
+    """
+    Same per-bar decisions as prefix_decisions, taken from one analyze_stock_history call.
+    All indicators only look backwards, so the value at bar i equals the last value of the prefix.
+    """
+    return main_analysis.analyze_stock_history(data, weights, dtype)['Decision'].tolist()
+
+
+def simulate_trades(data, decisions, profit_threshold=0.05, stop_loss_threshold=0.03):
+    """
+    Simulate the trades for a list of per-bar decisions (None for bars that are skipped).
+    """
     # Prepare for backtesting
     initial_capital = 300 # Initial capital for backtesting
     position = 0  # Current position (number of shares held)
@@ -22,18 +90,18 @@ def backtest(ticker, start_date, end_date, interval, weights, profit_threshold=0
     entry_price = None  # Track the price at which we entered the position
     count_profit_wins = 0
 
+    closes = data['Close'].to_numpy()
+    dates = data.index
+    decision = None
 
-    # Loop through the data to generate signals and simulate trades
+    # Loop through the decisions and simulate trades
     for i in range(len(data)):
-        subset_data = data.iloc[:i+1].copy()  # Current subset of data up to the current date
-        if len(subset_data) < 2:
+        if decisions[i] is None:
             continue
 
-        analysis = main_analysis.analyze_stock(subset_data, weights)
-        decision = analysis['Decision']
-
-        current_price = subset_data['Close'].iloc[-1]
-        date = subset_data.index[-1]
+        decision = decisions[i]
+        current_price = closes[i]
+        date = dates[i]
 
         if decision == "Consider Buy" and cash >= current_price:
             if position == 0:
@@ -65,7 +133,8 @@ def backtest(ticker, start_date, end_date, interval, weights, profit_threshold=0
 
 
     # Calculate final portfolio value
-    final_portfolio_value = cash + position * data['Close'].iloc[-1]
+    current_price = closes[-1]
+    final_portfolio_value = cash + position * current_price
     profit_or_loss = final_portfolio_value - initial_capital
     win_percentage = round((profit_or_loss/initial_capital)*100,0)
 
@@ -98,6 +167,174 @@ def backtest(ticker, start_date, end_date, interval, weights, profit_threshold=0
     }
 
 
+def compare_engines(data, weights, profit_threshold=0.05, stop_loss_threshold=0.03, lean=False, dtype=None):
+    """
+    Equivalence check between the single pass engine and the original prefix loop.
+
+    :param lean: Run the prefix loop in its memory-lean mode (see run_backtest).
+    :param dtype: Float type of the single pass engine's indicator values (see run_backtest).
+    :return: List of differences, empty when both engines agree on every decision and on the trade log.
+    """
+    prefix = prefix_decisions(data, weights, lean)
+    single_pass = single_pass_decisions(data, weights, dtype)
+
+    differences = []
+    for date, expected, actual in zip(data.index, prefix, single_pass):
+        if expected != actual:
+            differences.append(f"{date}: prefix={expected} single_pass={actual}")
+
+    expected_result = simulate_trades(data, prefix, profit_threshold, stop_loss_threshold)
+    actual_result = simulate_trades(data, single_pass, profit_threshold, stop_loss_threshold)
+    for key in ['Signals', 'Final_Portfolio_Value', 'Total_Hold_Time', 'Total_Wins']:
+        if expected_result[key] != actual_result[key]:
+            differences.append(f"{key}: prefix={expected_result[key]} single_pass={actual_result[key]}")
+
+    return differences
+
+
+@profiling.profiled('backtest signal context')
+def signal_context(data):
+    """
+    Everything a backtest needs that does not depend on the weights: the per-bar indicator
+    direction matrix, the closes and the bar timestamps. Computed once per ticker.
+    """
+    history = main_analysis.indicator_history(data)
+    return {
+        'directions': main_analysis.direction_matrix(history),
+        'close': data['Close'].to_numpy(dtype=float),
+        'dates': data.index.as_unit('ns').asi8,
+    }
+
+
+def simulate_trades_batch(close, dates, decisions, profit_threshold=0.05, stop_loss_threshold=0.03):
+    """
+    simulate_trades for many decision series at once, stepping through the bars with one
+    array operation per step for all candidates.
+
+    :param close: Closing prices, shape (bars,).
+    :param dates: Bar timestamps as int64 nanoseconds, shape (bars,).
+    :param decisions: Decision codes (1 buy, -1 sell, 0 hold) of shape (bars, candidates), or of shape (bars,)
+                      for one decision series shared by every candidate. The first bar is skipped.
+    :param profit_threshold: A threshold for all candidates, or an array with one per candidate (same for stop_loss_threshold).
+    :return: Dict of arrays with one value per candidate.
+    """
+    if decisions.ndim == 1:
+        # Same decisions for every exit rule: a read-only view, nothing is copied
+        candidates = np.broadcast(np.asarray(profit_threshold), np.asarray(stop_loss_threshold)).size
+        decisions = np.broadcast_to(decisions[:, None], (len(decisions), candidates))
+    candidates = decisions.shape[1]
+    initial_capital = 300
+    position = np.zeros(candidates)
+    cash = np.full(candidates, float(initial_capital))
+    entry_price = np.full(candidates, np.nan)
+    entry_date = np.zeros(candidates, dtype=np.int64)
+    count_buy_signals = np.zeros(candidates, dtype=int)
+    count_sell_signals = np.zeros(candidates, dtype=int)
+    count_profit_wins = np.zeros(candidates, dtype=int)
+    total_hold_days = np.zeros(candidates)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for i in range(1, len(close)):
+            current_price = close[i]
+
+            buy = (decisions[i] == 1) & (cash >= current_price)
+            if buy.any():
+                new_position = buy & (position == 0)
+                entry_price = np.where(new_position, current_price, entry_price)
+                entry_date = np.where(new_position, dates[i], entry_date)
+                position = np.where(buy, position + cash // current_price, position)
+                cash = np.where(buy, cash % current_price, cash)
+                count_buy_signals += buy
+
+            sell = (decisions[i] == -1) & (position > 0)
+            if sell.any():
+                price_increase = (current_price - entry_price) / entry_price
+                price_decrease = (entry_price - current_price) / entry_price
+                sell &= (price_increase >= profit_threshold) | (price_decrease >= stop_loss_threshold)
+
+                cash = np.where(sell, cash + position * current_price, cash)
+                position = np.where(sell, 0.0, position)
+                total_hold_days += np.where(sell, (dates[i] - entry_date) / 1e9 / (60 * 60 * 24), 0.0)
+                count_profit_wins += sell & (current_price - entry_price > 0)
+                entry_price = np.where(sell, np.nan, entry_price)
+                count_sell_signals += sell
+
+        average_hold_time = np.where(count_sell_signals > 0, np.round(total_hold_days / count_sell_signals, 0), 0)
+
+    final_portfolio_value = cash + position * close[-1]
+    profit_or_loss = final_portfolio_value - initial_capital
+
+    return {
+        'Final_Portfolio_Value': final_portfolio_value,
+        'Profit_or_Loss': profit_or_loss,
+        'Win_perc': np.round((profit_or_loss / initial_capital) * 100, 0),
+        'Average_Hold_Time': average_hold_time,
+        'Count_Buy_Signals': count_buy_signals,
+        'Count_Sell_Signals': count_sell_signals,
+        'Total_Wins': count_profit_wins,
+    }
+
+
+def score_weight_batch(context, weight_matrix, profit_threshold=0.05, stop_loss_threshold=0.03, chunk=512):
+    """
+    Backtest many weight sets against one signal_context.
+
+    Each weight set is scored as a product of the direction matrix with the weight vector,
+    then all of them go through simulate_trades_batch together.
+
+    :param weight_matrix: Array of shape (candidates, indicators) in main_analysis.INDICATORS order.
+    :param chunk: Candidates scored per step, to bound memory on long histories.
+    :return: Dict of arrays with one value per candidate (see simulate_trades_batch).
+    """
+    weight_matrix = np.atleast_2d(np.asarray(weight_matrix, dtype=float))
+
+    results = []
+    for start in range(0, len(weight_matrix), chunk):
+        with profiling.stage('backtest batch decisions'):
+            scores = main_analysis.weighted_scores(context['directions'], weight_matrix[start:start + chunk])
+            decisions = main_analysis.decision_codes(*scores)
+        with profiling.stage('backtest batch trades'):
+            results.append(simulate_trades_batch(context['close'], context['dates'], decisions, profit_threshold, stop_loss_threshold))
+
+    return {key: np.concatenate([result[key] for result in results]) for key in results[0]}
+
+
+
+def sweep_exit_rules(context, weights, profit_thresholds, stop_loss_thresholds):
+    """
+    Backtest one weight set with every (profit_threshold, stop_loss_threshold) pair of a grid.
+    The decisions do not depend on the exit rule, so they are scored once and all pairs go
+    through simulate_trades_batch together.
+
+    :param context: signal_context of the ticker.
+    :return: Dict of arrays of shape (len(profit_thresholds), len(stop_loss_thresholds)) (see simulate_trades_batch).
+    """
+    scores = main_analysis.weighted_scores(context['directions'], weights)
+    decisions = main_analysis.decision_codes(*scores)
+
+    profit_grid, stop_loss_grid = np.meshgrid(np.asarray(profit_thresholds, dtype=float),
+                                              np.asarray(stop_loss_thresholds, dtype=float), indexing='ij')
+    with profiling.stage('backtest exit rule sweep'):
+        results = simulate_trades_batch(context['close'], context['dates'], decisions, profit_grid.ravel(), stop_loss_grid.ravel())
+    return {key: values.reshape(profit_grid.shape) for key, values in results.items()}
+
+
+# Signal context of the optimization ticker, loaded once and reused by every evaluation
+optimization_context = None
+
+def load_optimization_context(ticker='VNQ', days=60, interval='1h'):
+    global optimization_context
+
+    date_back = datetime.now() - timedelta(days=days)
+    today = datetime.now() + timedelta(days=1)
+    start_date = date_back.strftime("%Y-%m-%d")
+    end_date = today.strftime("%Y-%m-%d")
+
+    data = main_analysis.fetch_stock_data(ticker, start_date, end_date, interval, progress=False)
+    optimization_context = signal_context(data)
+    return optimization_context
+
+
     # Wrapper function for optimization
 def optimize_weights(RSI_Status, MACD_Status, ADX_Status, MACD_Histogram_Status, VWAP_Status,
                      Golden_Cross_Status, Parabolic_SAR_Status, Volume_Trend, 
@@ -120,14 +357,11 @@ def optimize_weights(RSI_Status, MACD_Status, ADX_Status, MACD_Histogram_Status,
         'fibonacci_signal':fibonacci_signal
     }
 
-    date_back = datetime.now() - timedelta(days=60)
-    today = datetime.now() + timedelta(days=1)
-    start_date = date_back.strftime("%Y-%m-%d")
-    end_date = today.strftime("%Y-%m-%d")
-    
-    result = backtest('VNQ', start_date, end_date, '1h', weights)  # Adjust ticker, dates, and interval as needed
-    
-    return result['Win_perc']
+    # The indicators do not depend on the weights, so only the scoring and the trades are redone here
+    context = optimization_context if optimization_context is not None else load_optimization_context()
+    result = score_weight_batch(context, main_analysis.weight_vector(weights))
+
+    return result['Win_perc'][0]
 
 low_bound = 0.25
 high_bound = 1.5  
@@ -151,7 +385,40 @@ pbounds = {
 }
 
 
-def run_optimization():
+def params_to_weights(params):
+    # Optimizer parameter names -> analyze_stock weight names
+    weights = dict(params)
+    weights['CandleStick_Pattern_Status'] = weights.pop('candlestick_pattern')
+    return weights
+
+
+def random_weight_search(context, candidates=5000, random_state=1, profit_threshold=0.05, stop_loss_threshold=0.03):
+    """
+    Score `candidates` random weight sets inside pbounds in one batched call, with the given exit rule.
+
+    :return: (list of params dicts, array of Win_perc), best first.
+    """
+    rng = np.random.default_rng(random_state)
+    names = list(pbounds)
+    low = np.array([pbounds[name][0] for name in names])
+    high = np.array([pbounds[name][1] for name in names])
+    samples = rng.uniform(low, high, size=(candidates, len(names)))
+
+    params = [dict(zip(names, sample)) for sample in samples]
+    weight_matrix = np.array([main_analysis.weight_vector(params_to_weights(param)) for param in params])
+    win_perc = score_weight_batch(context, weight_matrix, profit_threshold, stop_loss_threshold)['Win_perc']
+
+    order = np.argsort(-win_perc, kind='stable')
+    return [params[i] for i in order], win_perc[order]
+
+
+def run_optimization(init_points=10, n_iter=30, random_candidates=0):
+    """
+    :param random_candidates: When above 0, first score this many random weight sets in one
+                              batched call and seed the optimizer with the best init_points of them.
+    """
+    from bayes_opt import BayesianOptimization
+
     # Initialize the optimizer
     optimizer = BayesianOptimization(
         f=optimize_weights,
@@ -159,12 +426,294 @@ def run_optimization():
         random_state=1
     )
 
+    if random_candidates:
+        context = optimization_context if optimization_context is not None else load_optimization_context()
+        params, win_perc = random_weight_search(context, random_candidates)
+        print(f"Best of {random_candidates} random weight sets: {win_perc[0]:.0f}%")
+        for param in params[:init_points]:
+            optimizer.probe(params=param, lazy=True)
+        init_points = 0
+
     # Run the optimization
     optimizer.maximize(
-        init_points=10,
-        n_iter=30
+        init_points=init_points,
+        n_iter=n_iter
     )
 
     # Get the best weights
     best_weights = optimizer.max['params']
-    print(best_weights)
\ No newline at end of file
+    print(best_weights)
+
+
+# Signal contexts of the optimization universe, set in every worker process by _init_universe_worker
+universe_contexts = {}
+
+def _init_universe_worker(contexts):
+    global universe_contexts
+    universe_contexts = contexts
+
+
+def _score_universe_ticker(ticker, weight_matrix, profit_threshold, stop_loss_threshold):
+    return score_weight_batch(universe_contexts[ticker], weight_matrix, profit_threshold, stop_loss_threshold)['Win_perc']
+
+
+def load_universe_contexts(tickers, days=60, interval='1h', workers=None):
+    """
+    Download the universe in one batch and compute each ticker's signal_context in parallel.
+
+    :return: Dict of ticker -> signal_context, without the tickers that returned no data.
+    """
+    date_back = datetime.now() - timedelta(days=days)
+    today = datetime.now() + timedelta(days=1)
+    start_date = date_back.strftime("%Y-%m-%d")
+    end_date = today.strftime("%Y-%m-%d")
+
+    frames = main_analysis.fetch_many_stock_data(tickers, start_date, end_date, interval, progress=False)
+    tickers = [ticker for ticker in tickers if not frames[ticker].empty]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        contexts = list(executor.map(signal_context, [frames[ticker] for ticker in tickers]))
+    return dict(zip(tickers, contexts))
+
+
+def suggest_batch(optimizer, size, random_state=None):
+    """
+    `size` different points to evaluate together.
+
+    Uses the constant liar strategy: every suggestion is registered in a scratch optimizer with
+    the mean target seen so far, so the next suggestion is pushed somewhere else. Before anything
+    has been evaluated the points are random.
+    """
+    from bayes_opt import BayesianOptimization
+    from bayes_opt.exception import NotUniqueError
+
+    if not optimizer.res:
+        return optimizer.random_sample(size)
+
+    scratch = BayesianOptimization(f=None, pbounds=pbounds, random_state=random_state, verbose=0)
+    for result in optimizer.res:
+        scratch.register(params=result['params'], target=result['target'])
+    liar = np.mean([result['target'] for result in optimizer.res])
+
+    suggestions = []
+    for _ in range(size):
+        params = scratch.suggest()
+        try:
+            scratch.register(params=params, target=liar)
+        except NotUniqueError:
+            params = scratch.random_sample(1)[0]
+            scratch.register(params=params, target=liar)
+        suggestions.append(params)
+    return suggestions
+
+
+def run_universe_optimization(tickers=None, days=60, interval='1h', init_points=10, n_iter=30, batch_size=None,
+                              workers=None, profit_threshold=0.05, stop_loss_threshold=0.03, random_state=1):
+    """
+    Optimize the weights for the average Win_perc over a universe of tickers (by default backtest_group.xlsx).
+
+    Every round suggests batch_size weight sets; each worker process scores the whole batch on
+    one ticker at a time, so all cores are busy whatever the batch size.
+
+    :param init_points: Number of random weight sets evaluated before the Bayesian suggestions start.
+    :param n_iter: Number of suggested weight sets evaluated after that.
+    :param batch_size: Weight sets evaluated per round (default: the number of workers).
+    :return: The optimizer, with the best weights in optimizer.max.
+    """
+    from bayes_opt import BayesianOptimization
+
+    if tickers is None:
+        tickers = main_analysis.load_backtest_group()['Symbol'].tolist()
+    workers = workers or os.cpu_count()
+    batch_size = batch_size or workers
+
+    contexts = load_universe_contexts(tickers, days, interval, workers)
+    if not contexts:
+        print("No data found for the optimization universe")
+        return None
+    print(f"Optimizing weights over {len(contexts)} tickers, {batch_size} weight sets per round on {workers} workers")
+
+    optimizer = BayesianOptimization(f=None, pbounds=pbounds, random_state=random_state, verbose=0)
+    total = init_points + n_iter
+    start_time = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_universe_worker, initargs=(contexts,)) as executor:
+        while len(optimizer.res) < total:
+            evaluated = len(optimizer.res)
+            size = min(batch_size, total - evaluated)
+            if evaluated < init_points:
+                size = min(size, init_points - evaluated)
+                batch = optimizer.random_sample(size)
+            else:
+                batch = suggest_batch(optimizer, size, random_state=evaluated)
+
+            weight_matrix = np.array([main_analysis.weight_vector(params_to_weights(params)) for params in batch])
+            win_perc = np.mean(list(executor.map(
+                _score_universe_ticker, list(contexts), repeat(weight_matrix),
+                repeat(profit_threshold), repeat(stop_loss_threshold)
+            )), axis=0)
+
+            for params, target in zip(batch, win_perc):
+                optimizer.register(params=params, target=float(target))
+
+            print(f"[{len(optimizer.res)}/{total}] batch best {win_perc.max():.1f}%, "
+                  f"best so far {optimizer.max['target']:.1f}% ({time.perf_counter() - start_time:.0f}s)")
+
+    print(params_to_weights(optimizer.max['params']))
+    return optimizer
+
+
+def walk_forward_folds(bars, train_bars, test_bars, step=None):
+    """
+    Rolling train/test windows over `bars` bars: every test window directly follows its train
+    window, and the next fold starts `step` bars later (default: test_bars, so test windows do not overlap).
+
+    :return: List of ((train_start, train_stop), (test_start, test_stop)) index ranges.
+    """
+    step = step or test_bars
+    folds = []
+    start = 0
+    while start + train_bars + test_bars <= bars:
+        folds.append(((start, start + train_bars), (start + train_bars, start + train_bars + test_bars)))
+        start += step
+    return folds
+
+
+def slice_context(context, start, stop):
+    # Rows start:stop of a signal_context, as views; the indicators keep the warm up of the full history
+    return {key: values[start:stop] for key, values in context.items()}
+
+
+# Runs in a worker process, on the contexts set by _init_universe_worker
+def _walk_forward_fold(ticker, fold, train, test, baseline, candidates, profit_threshold, stop_loss_threshold):
+    context = universe_contexts[ticker]
+    train_context = slice_context(context, *train)
+    test_context = slice_context(context, *test)
+
+    # Optimize on the train window only, then score the winner and the baseline on the unseen test window
+    params, train_win_perc = random_weight_search(train_context, candidates, fold, profit_threshold, stop_loss_threshold)
+    best_weights = params_to_weights(params[0])
+    weight_matrix = np.array([main_analysis.weight_vector(best_weights), baseline])
+    test_win_perc = score_weight_batch(test_context, weight_matrix, profit_threshold, stop_loss_threshold)['Win_perc']
+    baseline_train = score_weight_batch(train_context, baseline, profit_threshold, stop_loss_threshold)['Win_perc'][0]
+
+    dates = context['dates']
+    return {
+        'Ticker': ticker,
+        'Fold': fold,
+        'Train_Start': pd.Timestamp(dates[train[0]]),
+        'Test_Start': pd.Timestamp(dates[test[0]]),
+        'Test_End': pd.Timestamp(dates[test[1] - 1]),
+        'Weights': best_weights,
+        'Train_Win_perc': float(train_win_perc[0]),
+        'Test_Win_perc': float(test_win_perc[0]),
+        'Baseline_Train_Win_perc': float(baseline_train),
+        'Baseline_Test_Win_perc': float(test_win_perc[1]),
+    }
+
+
+def run_walk_forward(weights, tickers=None, days=365, interval='1d', folds=5, train_fraction=0.5, candidates=2000,
+                     workers=None, profit_threshold=0.05, stop_loss_threshold=0.03):
+    """
+    Walk-forward validation: split every ticker's history into `folds` rolling train/test windows,
+    pick the best of `candidates` random weight sets on each train window and score it on the
+    test window that follows, next to the given `weights`.
+
+    The indicator history of every ticker is computed once (signal_context) and sliced for each
+    window; the (ticker, fold) pairs run in parallel processes.
+
+    :param train_fraction: Share of the history in a train window, the rest is split into the test windows.
+    :return: List of fold results (dicts), in ticker and fold order.
+    """
+    if tickers is None:
+        tickers = main_analysis.load_backtest_group()['Symbol'].tolist()
+    workers = workers or os.cpu_count()
+
+    contexts = load_universe_contexts(tickers, days, interval, workers)
+    if not contexts:
+        print("No data found for the walk-forward tickers")
+        return []
+
+    tasks = []
+    for ticker, context in contexts.items():
+        bars = len(context['close'])
+        train_bars = int(bars * train_fraction)
+        test_bars = (bars - train_bars) // folds
+        if train_bars < 2 or test_bars < 2:
+            print(f"Not enough bars for {folds} folds of {ticker}")
+            continue
+        # The rounding of test_bars can leave room for extra windows; keep the last `folds`, which end on the latest bars
+        for fold, (train, test) in enumerate(walk_forward_folds(bars, train_bars, test_bars)[-folds:]):
+            tasks.append((ticker, fold, train, test))
+    if not tasks:
+        return []
+
+    baseline = main_analysis.weight_vector(weights)
+    print(f"Walk-forward over {len(contexts)} tickers at {interval}: {len(tasks)} folds of {candidates} weight sets on {workers} workers")
+
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_universe_worker, initargs=(contexts,)) as executor:
+        results = list(executor.map(
+            _walk_forward_fold, *zip(*tasks), repeat(baseline), repeat(candidates),
+            repeat(profit_threshold), repeat(stop_loss_threshold)
+        ))
+
+    print(f"{'Ticker':<8} {'Fold':>4} {'Test window':<23} {'Train %':>8} {'Test %':>7} {'Baseline train %':>17} {'Baseline test %':>16}")
+    for result in results:
+        window = f"{result['Test_Start']:%Y-%m-%d} - {result['Test_End']:%Y-%m-%d}"
+        print(f"{result['Ticker']:<8} {result['Fold']:>4} {window:<23} {result['Train_Win_perc']:>8.0f} {result['Test_Win_perc']:>7.0f} "
+              f"{result['Baseline_Train_Win_perc']:>17.0f} {result['Baseline_Test_Win_perc']:>16.0f}")
+
+    if results:
+        # In-sample minus out-of-sample is how much the optimized weights overfit
+        print(f"Average over {len(results)} folds: optimized train {np.mean([r['Train_Win_perc'] for r in results]):.1f}%, "
+              f"test {np.mean([r['Test_Win_perc'] for r in results]):.1f}%; "
+              f"baseline train {np.mean([r['Baseline_Train_Win_perc'] for r in results]):.1f}%, "
+              f"test {np.mean([r['Baseline_Test_Win_perc'] for r in results]):.1f}% "
+              f"({time.perf_counter() - start_time:.0f}s)")
+    return results
+
+
+# Default exit rule grid: 1% to 10% in steps of 1%, 100 pairs
+PROFIT_THRESHOLDS = np.round(np.arange(0.01, 0.105, 0.01), 2)
+STOP_LOSS_THRESHOLDS = np.round(np.arange(0.01, 0.105, 0.01), 2)
+
+
+def _sweep_universe_ticker(ticker, weights, profit_thresholds, stop_loss_thresholds):
+    return sweep_exit_rules(universe_contexts[ticker], weights, profit_thresholds, stop_loss_thresholds)
+
+
+def run_exit_rule_sweep(weights, tickers=None, days=365, interval='1d', profit_thresholds=PROFIT_THRESHOLDS,
+                        stop_loss_thresholds=STOP_LOSS_THRESHOLDS, workers=None):
+    """
+    sweep_exit_rules for every ticker (by default backtest_group.xlsx), one process per ticker.
+
+    :return: Dict of ticker -> Win_perc grid as a DataFrame (profit thresholds as rows, stop loss thresholds as columns).
+    """
+    if tickers is None:
+        tickers = main_analysis.load_backtest_group()['Symbol'].tolist()
+    workers = workers or os.cpu_count()
+
+    contexts = load_universe_contexts(tickers, days, interval, workers)
+    if not contexts:
+        print("No data found for the exit rule sweep")
+        return {}
+
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_universe_worker, initargs=(contexts,)) as executor:
+        results = list(executor.map(
+            _sweep_universe_ticker, list(contexts), repeat(weights), repeat(profit_thresholds), repeat(stop_loss_thresholds)
+        ))
+
+    grids = {
+        ticker: pd.DataFrame(result['Win_perc'], index=pd.Index(profit_thresholds, name='Profit'),
+                             columns=pd.Index(stop_loss_thresholds, name='Stop loss'))
+        for ticker, result in zip(contexts, results)
+    }
+
+    average = sum(grids.values()) / len(grids)
+    best_profit, best_stop_loss = average.stack().idxmax()
+    print(f"Average Win_perc over {len(grids)} tickers, {average.size} exit rules ({time.perf_counter() - start_time:.1f}s):")
+    print(average.round(1).to_string())
+    print(f"Best exit rule: profit {best_profit:.2f}, stop loss {best_stop_loss:.2f} ({average.loc[best_profit, best_stop_loss]:.1f}%)")
+    return grids
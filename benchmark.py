@@ -0,0 +1,528 @@
+import argparse
+import inspect
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import tech_analysis_tools
+import data_cache
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak RSS is then reported as None
+    resource = None
+
+
+def synthetic_ohlcv(bars, seed=0, freq='h'):
+    """
+    Reproducible random walk OHLCV frame, so benchmarks run without the network.
+
+    :param bars: Number of bars to generate.
+    :param seed: Seed for the random generator.
+    :param freq: Bar frequency of the DatetimeIndex.
+    :return: DataFrame with Open, High, Low, Close, Adj Close and Volume columns.
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    open_ = close * np.exp(rng.normal(0, 0.004, bars))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 0.004, bars)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 0.004, bars)))
+    volume = rng.integers(1_000, 100_000, bars).astype(float)
+
+    return pd.DataFrame({
+        'Open': open_,
+        'High': high,
+        'Low': low,
+        'Close': close,
+        'Adj Close': close,
+        'Volume': volume,
+    }, index=pd.date_range('2020-01-01', periods=bars, freq=freq))
+
+
+def reference_parabolic_sar(data, step=0.02, max_step=0.2):
+    # The Series.iloc loop calculate_parabolic_sar used before parabolic_sar_array, kept as the baseline
+    high = data['High']
+    low = data['Low']
+    close = data['Close']
+
+    af = step
+    uptrend = True
+    ep = low.iloc[0]
+    sar = high.iloc[0]
+    sar_values = [sar]
+
+    for i in range(1, len(close)):
+        if uptrend:
+            sar = sar + af * (ep - sar)
+            if close.iloc[i] < sar:
+                uptrend = False
+                sar = ep
+                af = step
+                ep = low.iloc[i]
+        else:
+            sar = sar - af * (sar - ep)
+            if close.iloc[i] > sar:
+                uptrend = True
+                sar = ep
+                af = step
+                ep = high.iloc[i]
+
+        if uptrend:
+            if high.iloc[i] > ep:
+                ep = high.iloc[i]
+                af = min(af + step, max_step)
+        else:
+            if low.iloc[i] < ep:
+                ep = low.iloc[i]
+                af = min(af + step, max_step)
+
+        sar_values.append(sar)
+
+    return np.array(sar_values)
+
+
+def reference_rsi_divergence(data):
+    # The rolling.apply and row loop versions of the pattern detectors used before swing_points, kept as the baseline
+    rsi = tech_analysis_tools.calculate_rsi(data)
+    price_highs = data['High'].rolling(window=3).apply(lambda x: x.iloc[1] if (x.iloc[1] > x.iloc[0] and x.iloc[1] > x.iloc[2]) else np.nan, raw=False)
+    rsi_highs = rsi.rolling(window=3).apply(lambda x: x.iloc[1] if (x.iloc[1] > x.iloc[0] and x.iloc[1] > x.iloc[2]) else np.nan, raw=False)
+
+    last_signal = tech_analysis_tools.NO_DIVERGENCE
+    for i in range(2, len(rsi)):
+        if pd.notna(price_highs.iloc[i]) and pd.notna(rsi_highs.iloc[i]):
+            if data['High'].iloc[i] > data['High'].iloc[i-2] and rsi.iloc[i] < rsi.iloc[i-2]:
+                last_signal = tech_analysis_tools.BEARISH_DIVERGENCE
+            elif data['Low'].iloc[i] < data['Low'].iloc[i-2] and rsi.iloc[i] > rsi.iloc[i-2]:
+                last_signal = tech_analysis_tools.BULLISH_DIVERGENCE
+    return last_signal
+
+
+def reference_head_and_shoulders(data):
+    peaks = data['High'].rolling(window=3).apply(lambda x: x.iloc[1] if x.iloc[1] > x.iloc[0] and x.iloc[1] > x.iloc[2] else np.nan).dropna()
+    troughs = data['Low'].rolling(window=3).apply(lambda x: x.iloc[1] if x.iloc[1] < x.iloc[0] and x.iloc[1] < x.iloc[2] else np.nan).dropna()
+
+    if len(peaks) >= 3 and len(troughs) >= 3:
+        left_peak, head_peak, right_peak = peaks.iloc[-3:]
+        left_trough, head_trough, right_trough = troughs.iloc[-3:]
+        if left_peak < head_peak > right_peak and left_trough < head_trough < right_trough:
+            return tech_analysis_tools.HEAD_AND_SHOULDERS
+        elif left_peak > head_peak < right_peak and left_trough > head_trough < right_trough:
+            return tech_analysis_tools.INVERSE_HEAD_AND_SHOULDERS
+    return tech_analysis_tools.NO_HEAD_AND_SHOULDERS
+
+
+def reference_double_top_bottom(data, lookback=5, tolerance=0.02):
+    peaks = data['High'].rolling(window=lookback).apply(lambda x: x.argmax() if not np.isnan(x).any() else np.nan, raw=True)
+    troughs = data['Low'].rolling(window=lookback).apply(lambda x: x.argmin() if not np.isnan(x).any() else np.nan, raw=True)
+    peaks = peaks.dropna().astype(int)
+    troughs = troughs.dropna().astype(int)
+
+    if len(peaks) >= 2:
+        peak1, peak2 = peaks.iloc[-2], peaks.iloc[-1]
+        if abs(data['High'].iloc[peak1] - data['High'].iloc[peak2]) / data['High'].iloc[peak1] < tolerance:
+            return tech_analysis_tools.DOUBLE_TOP
+    if len(troughs) >= 2:
+        trough1, trough2 = troughs.iloc[-2], troughs.iloc[-1]
+        if abs(data['Low'].iloc[trough1] - data['Low'].iloc[trough2]) / data['Low'].iloc[trough1] < tolerance:
+            return tech_analysis_tools.DOUBLE_BOTTOM
+    return tech_analysis_tools.NO_DOUBLE_TOP_BOTTOM
+
+
+def time_call(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def bench_parabolic_sar(sizes=(10_000, 100_000, 1_000_000), tickers=500, batch_bars=10_000):
+    print("Parabolic SAR: Series.iloc loop vs parabolic_sar_array")
+    print(f"{'Bars':>10} {'Loop (s)':>10} {'Array (s)':>10} {'Speedup':>9}  Identical")
+    for bars in sizes:
+        data = synthetic_ohlcv(bars)
+        reference_time, expected = time_call(reference_parabolic_sar, data)
+        array_time, actual = time_call(tech_analysis_tools.parabolic_sar_array, data['High'], data['Low'], data['Close'])
+        identical = np.array_equal(expected, actual)
+        print(f"{bars:>10} {reference_time:>10.3f} {array_time:>10.3f} {reference_time / array_time:>8.1f}x  {identical}")
+
+    # Many tickers: one 1-D call per ticker vs a single 2-D call
+    frames = [synthetic_ohlcv(batch_bars, seed=seed) for seed in range(tickers)]
+    high = np.column_stack([frame['High'] for frame in frames])
+    low = np.column_stack([frame['Low'] for frame in frames])
+    close = np.column_stack([frame['Close'] for frame in frames])
+
+    single_time, expected = time_call(lambda: np.column_stack([
+        tech_analysis_tools.parabolic_sar_array(high[:, i], low[:, i], close[:, i]) for i in range(tickers)
+    ]))
+    batch_time, actual = time_call(tech_analysis_tools.parabolic_sar_array, high, low, close)
+    print(f"\n{tickers} tickers x {batch_bars} bars: per ticker {single_time:.3f}s, batched {batch_time:.3f}s "
+          f"({single_time / batch_time:.1f}x), identical {np.array_equal(expected, actual)}")
+
+
+def bench_ohlcv_cache(bars=10_000, latency=0.5):
+    """
+    Cold vs warm fetch time of data_cache.fetch_cached, with a synthetic download
+    that sleeps `latency` seconds to stand in for the network.
+    """
+    history = synthetic_ohlcv(bars, freq='h')
+
+    def download(ticker, start_date, end_date, interval):
+        time.sleep(latency)
+        return history[(history.index >= start_date) & (history.index < end_date)]
+
+    start_date = history.index[0].strftime("%Y-%m-%d")
+    end_date = (history.index[-1] + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cold_time, _ = time_call(data_cache.fetch_cached, 'SYNTH', start_date, end_date, '1h', download, cache_dir)
+        warm_time, _ = time_call(data_cache.fetch_cached, 'SYNTH', start_date, end_date, '1h', download, cache_dir)
+        size = data_cache.cache_size(cache_dir)
+
+    print(f"\nOHLCV cache, {bars} bars, {latency}s simulated download: cold {cold_time:.3f}s, "
+          f"warm {warm_time:.3f}s, {size / 1024:.0f} KB on disk")
+
+
+def bench_panel(tickers=500, bars=2_000):
+    """
+    One call per ticker vs one panel call per indicator for a whole universe.
+    """
+    frames = {f'T{seed}': synthetic_ohlcv(bars, seed=seed) for seed in range(tickers)}
+    high, low, close, volume = (tech_analysis_tools.panel_frame(frames, column) for column in ['High', 'Low', 'Close', 'Volume'])
+
+    def per_ticker():
+        for frame in frames.values():
+            tech_analysis_tools.calculate_rsi(frame)
+            tech_analysis_tools.calculate_macd(frame)
+            tech_analysis_tools.calculate_sma(frame, 50)
+            tech_analysis_tools.calculate_sma(frame, 200)
+            tech_analysis_tools.calculate_bollinger_bands(frame)
+            tech_analysis_tools.calculate_stochastic_oscillator(frame)
+            tech_analysis_tools.calculate_adx(frame)
+            tech_analysis_tools.calculate_vwap(frame)
+            tech_analysis_tools.calculate_vma(frame)
+
+    def panel():
+        tech_analysis_tools.panel_rsi(close)
+        tech_analysis_tools.panel_macd(close)
+        tech_analysis_tools.panel_sma(close, 50)
+        tech_analysis_tools.panel_sma(close, 200)
+        tech_analysis_tools.panel_bollinger_bands(close)
+        tech_analysis_tools.panel_stochastic_oscillator(high, low, close)
+        tech_analysis_tools.panel_adx(high, low, close)
+        tech_analysis_tools.panel_vwap(high, low, close, volume)
+        tech_analysis_tools.panel_vma(volume)
+
+    per_ticker_time, _ = time_call(per_ticker)
+    panel_time, _ = time_call(panel)
+    print(f"\nIndicators for {tickers} tickers x {bars} bars: per ticker {per_ticker_time:.3f}s, "
+          f"panel {panel_time:.3f}s ({per_ticker_time / panel_time:.1f}x)")
+
+
+def _same_analysis(expected, actual):
+    # Statuses must match exactly, numbers up to float rounding (NaN equal to NaN)
+    for key, value in expected.items():
+        if isinstance(value, (str, dict)) or value is None:
+            if actual[key] != value:
+                return False
+        elif not np.isclose(actual[key], value, rtol=1e-9, equal_nan=True):
+            return False
+    return True
+
+
+def bench_live(bars=600, start_bars=30, missing_bars=(200, 201, 450)):
+    """
+    LiveSymbol fed one bar at a time vs analyze_stock on every prefix, on a clean frame and
+    on one with missing bars (NaN rows), which must give the same analyses.
+    """
+    import main_analysis
+    import live_analysis
+
+    weights = {name: 1.0 for name in main_analysis.INDICATORS}
+    clean = synthetic_ohlcv(bars)
+    gaps = clean.copy()
+    gaps.iloc[list(missing_bars), gaps.columns.get_indexer(live_analysis.PRICE_COLUMNS)] = np.nan
+
+    print(f"\nLive mode, {bars - start_bars} bars one at a time: LiveSymbol vs analyze_stock on every prefix")
+    print(f"{'Frame':>10} {'Batch (s)':>10} {'Live (s)':>10} {'Speedup':>9}  Identical")
+    for name, data in [('clean', clean), ('NaN rows', gaps)]:
+        prefixes = [data.iloc[:end] for end in range(start_bars, bars + 1)]
+        live_symbol = live_analysis.LiveSymbol('SYNTH')
+
+        def live():
+            analyses = []
+            for prefix in prefixes:
+                live_symbol.update(prefix, weights)
+                analyses.append(live_symbol.analysis)
+            return analyses
+
+        batch_time, expected = time_call(lambda: [main_analysis.analyze_stock(prefix.copy(), weights) for prefix in prefixes])
+        live_time, actual = time_call(live)
+        identical = all(_same_analysis(e, a) for e, a in zip(expected, actual))
+        print(f"{name:>10} {batch_time:>10.3f} {live_time:>10.3f} {batch_time / live_time:>8.1f}x  {identical}")
+
+
+def bench_patterns(sizes=(1_000, 10_000, 100_000)):
+    """
+    The three pattern detectors: rolling.apply baselines vs one shared swing_points index.
+    """
+    print("\nPatterns (RSI divergence, Head and Shoulders, Double Top/Bottom): rolling.apply vs swing_points")
+    print(f"{'Bars':>10} {'Loop (s)':>10} {'Swings (s)':>10} {'Speedup':>9}  Identical")
+    for bars in sizes:
+        data = synthetic_ohlcv(bars)
+
+        def reference():
+            return (reference_rsi_divergence(data), reference_head_and_shoulders(data), reference_double_top_bottom(data))
+
+        def shared():
+            swings = tech_analysis_tools.swing_points(data)
+            return (tech_analysis_tools.rsi_divergence_signal(data, swings),
+                    tech_analysis_tools.head_and_shoulders_signal(data.copy(), swings),
+                    tech_analysis_tools.double_top_bottom_signal(data, swings=swings))
+
+        reference_time, expected = time_call(reference)
+        shared_time, actual = time_call(shared)
+        print(f"{bars:>10} {reference_time:>10.3f} {shared_time:>10.3f} {reference_time / shared_time:>8.1f}x  {expected == actual}")
+
+
+# Values for the required arguments of the functions in the suite, by parameter name
+SUITE_ARGUMENTS = {
+    'data': lambda data: data.copy(),
+    'index': lambda data: len(data) - 1,
+    'window': lambda data: 20,
+    'high': lambda data: data['High'].to_numpy(),
+    'low': lambda data: data['Low'].to_numpy(),
+    'close': lambda data: data['Close'].to_numpy(),
+    'volume': lambda data: data['Volume'].to_numpy(),
+    'purchase_date': lambda data: '2020-01-01',
+    'purchase_price': lambda data: 100.0,
+    'current_price': lambda data: data['Close'].iloc[-1],
+    'quantity': lambda data: 10,
+    'code': lambda data: 1,
+    'frames': lambda data: {'A': data, 'B': data},
+    'column': lambda data: 'Close',
+}
+
+
+def suite_functions():
+    """
+    The functions timed by bench_suite: every public function of tech_analysis_tools,
+    analyze_stock and run_backtest (backtest without the download).
+    """
+    import main_analysis
+    import back_test
+
+    weights = {name: 1.0 for name in main_analysis.INDICATORS}
+    functions = {
+        f'tech_analysis_tools.{name}': function
+        for name, function in inspect.getmembers(tech_analysis_tools, inspect.isfunction)
+        if not name.startswith('_') and function.__module__ == tech_analysis_tools.__name__
+    }
+    functions['main_analysis.analyze_stock'] = lambda data: main_analysis.analyze_stock(data, weights)
+    functions['back_test.run_backtest'] = lambda data: back_test.run_backtest(data, weights)
+    return functions
+
+
+def _suite_arguments(function, data):
+    arguments = []
+    for parameter in inspect.signature(function).parameters.values():
+        if parameter.default is not inspect.Parameter.empty:
+            continue
+        arguments.append(SUITE_ARGUMENTS[parameter.name](data))
+    return arguments
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far, in MB (None where it cannot be read).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+# Backtest modes compared by bench_memory: run_backtest keyword arguments
+MEMORY_MODES = {
+    'prefix': {'engine': 'prefix'},
+    'prefix lean': {'engine': 'prefix', 'lean': True},
+    'single_pass': {'engine': 'single_pass'},
+    'single_pass float32': {'engine': 'single_pass', 'dtype': 'float32'},
+}
+
+
+def _memory_run(mode, bars):
+    # Runs in the child process started by bench_memory, prints its measurements as JSON
+    import main_analysis
+    import back_test
+
+    weights = {name: 1.0 for name in main_analysis.INDICATORS}
+    data = synthetic_ohlcv(bars, freq='min')
+    baseline = peak_rss_mb()
+
+    seconds, _ = time_call(back_test.run_backtest, data, weights, **MEMORY_MODES[mode])
+    print(json.dumps({'seconds': seconds, 'baseline_mb': baseline, 'peak_mb': peak_rss_mb()}))
+
+
+def bench_memory(bars=200_000, prefix_bars=500):
+    """
+    Peak RSS of a backtest in every MEMORY_MODES mode, each in a fresh interpreter so the peaks
+    do not carry over. The prefix engine is quadratic, so it runs on prefix_bars bars.
+
+    :return: Dict of "memory mode@bars" -> peak MB.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    code = "import sys, benchmark; benchmark._memory_run(sys.argv[1], int(sys.argv[2]))"
+
+    print(f"\nBacktest peak memory (minute bars)")
+    print(f"{'Mode':<22} {'Bars':>8} {'Seconds':>9} {'Peak RSS (MB)':>14} {'Above data (MB)':>16}")
+    results = {}
+    for mode, arguments in MEMORY_MODES.items():
+        mode_bars = prefix_bars if arguments['engine'] == 'prefix' else bars
+        output = subprocess.run([sys.executable, '-c', code, mode, str(mode_bars)], cwd=directory, capture_output=True, text=True, check=True)
+        run = json.loads(output.stdout.strip().splitlines()[-1])
+        if run['peak_mb'] is None:
+            print(f"{mode:<22} {mode_bars:>8} {run['seconds']:>9.2f} {'n/a':>14} {'n/a':>16}")
+            continue
+        results[f'memory {mode}@{mode_bars}'] = run['peak_mb']
+        print(f"{mode:<22} {mode_bars:>8} {run['seconds']:>9.2f} {run['peak_mb']:>14.1f} {run['peak_mb'] - run['baseline_mb']:>16.1f}")
+    return results
+
+
+# Modules whose import time is part of the suite
+IMPORT_MODULES = ['tech_analysis_tools', 'data_cache', 'market_data', 'main_analysis', 'back_test',
+                  'live_analysis', 'analyze_hist_data', 'etf_screener']
+
+
+def bench_imports(modules=IMPORT_MODULES, repeat=3):
+    """
+    Time a cold import of every module, each in a fresh interpreter.
+
+    :return: Dict of "import module" -> seconds (the fastest of `repeat` runs).
+    """
+    code = "import sys, time; start = time.perf_counter(); __import__(sys.argv[1]); print(time.perf_counter() - start)"
+    directory = os.path.dirname(os.path.abspath(__file__))
+
+    results = {}
+    for module in modules:
+        timings = []
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable, '-c', code, module], cwd=directory, capture_output=True, text=True, check=True)
+            timings.append(float(output.stdout.strip().splitlines()[-1]))
+        results[f'import {module}'] = min(timings)
+        print(f"{'import ' + module:<55} {results[f'import {module}']:>24.4f}s")
+    return results
+
+
+def bench_suite(sizes=(1_000, 10_000), repeat=3, seed=0):
+    """
+    Time the module imports, then every suite function on synthetic frames of each size.
+
+    :param repeat: Runs per function and size; the fastest one is kept.
+    :return: Dict of "function@bars" (and "import module") -> seconds.
+    """
+    import main_analysis
+
+    results = bench_imports(repeat=repeat)
+    for bars in sizes:
+        # Some analyze_* functions read indicator columns that analyze_stock adds first
+        data = synthetic_ohlcv(bars, seed=seed)
+        main_analysis.analyze_stock(data, {name: 1.0 for name in main_analysis.INDICATORS})
+        for name, function in suite_functions().items():
+            timings = []
+            for _ in range(repeat):
+                # Fresh arguments every run, some functions add columns to the frame
+                arguments = _suite_arguments(function, data)
+                timings.append(time_call(function, *arguments)[0])
+            results[f'{name}@{bars}'] = min(timings)
+            print(f"{name:<55} {bars:>8} bars {results[f'{name}@{bars}']:>10.4f}s")
+    return results
+
+
+def write_results(path, results, repeat):
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'repeat': repeat,
+        'peak_rss_mb': peak_rss_mb(),
+        'results': results,
+    }
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2)
+
+
+def compare_results(baseline_path, results, tolerance=0.25, min_seconds=0.001):
+    """
+    Flag functions that got slower than the baseline file by more than `tolerance` (0.25 = 25%).
+    Timings below min_seconds in both runs are ignored as noise.
+
+    :return: List of (key, baseline seconds, current seconds) for the regressions.
+    """
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+
+    regressions = []
+    for key, seconds in results.items():
+        before = baseline['results'].get(key)
+        if before is None or max(before, seconds) < min_seconds:
+            continue
+        if seconds > before * (1 + tolerance):
+            regressions.append((key, before, seconds))
+
+    print(f"\nCompared with {baseline_path} (numpy {baseline['numpy']}, pandas {baseline['pandas']}, {baseline['created']})")
+    for key, before, seconds in regressions:
+        print(f"REGRESSION {key}: {before:.4f}s -> {seconds:.4f}s ({seconds / before:.2f}x)")
+    if not regressions:
+        print(f"No regressions above {tolerance:.0%}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the analysis tools')
+    parser.add_argument('--sar', action='store_true', help='Only run the Parabolic SAR benchmark')
+    parser.add_argument('--cache', action='store_true', help='Only run the OHLCV cache benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000], help='Bar counts for the Parabolic SAR benchmark')
+    parser.add_argument('--tickers', type=int, default=500, help='Number of tickers for the batched Parabolic SAR benchmark')
+    parser.add_argument('--patterns', action='store_true', help='Only run the pattern detector benchmark')
+    parser.add_argument('--pattern-sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000], help='Bar counts for the pattern detector benchmark')
+    parser.add_argument('--memory', action='store_true', help='Only run the backtest peak memory benchmark')
+    parser.add_argument('--memory-bars', type=int, default=200_000, help='Bars for the single pass runs of the memory benchmark')
+    parser.add_argument('--prefix-bars', type=int, default=500, help='Bars for the prefix runs of the memory benchmark')
+    parser.add_argument('--panel', action='store_true', help='Only run the per ticker vs panel indicator benchmark')
+    parser.add_argument('--live', action='store_true', help='Only check and time the live mode against analyze_stock, with and without missing bars')
+    parser.add_argument('--suite', action='store_true', help='Only time the module imports, every tech_analysis_tools function, analyze_stock and backtest')
+    parser.add_argument('--bars', type=int, nargs='+', default=[1_000, 10_000], help='Bar counts for the suite')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per suite function, the fastest is kept')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON file the suite timings are written to')
+    parser.add_argument('--compare', help='Earlier JSON results to flag regressions against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Slowdown flagged as a regression (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    run_all = not (args.sar or args.cache or args.patterns or args.memory or args.panel or args.live or args.suite)
+    if args.sar or run_all:
+        bench_parabolic_sar(sizes=args.sizes, tickers=args.tickers)
+    if args.cache or run_all:
+        bench_ohlcv_cache()
+    if args.patterns or run_all:
+        bench_patterns(sizes=args.pattern_sizes)
+    if args.memory or run_all:
+        bench_memory(args.memory_bars, args.prefix_bars)
+    if args.panel or run_all:
+        bench_panel(tickers=args.tickers)
+    if args.live or run_all:
+        bench_live()
+    if args.suite or run_all:
+        results = bench_suite(sizes=args.bars, repeat=args.repeat)
+        write_results(args.output, results, args.repeat)
+        peak = peak_rss_mb()
+        print(f"\nTimings written to {args.output}, peak RSS {f'{peak:.0f} MB' if peak is not None else 'n/a'}")
+        if args.compare and compare_results(args.compare, results, args.tolerance):
+            sys.exit(1)
@@ -0,0 +1,347 @@
+import argparse
+import os
+import re
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+# Bars are stored one file per (ticker, interval), one array per column
+CACHE_DIR = '.ohlcv_cache'
+MAX_CACHE_BYTES = 500 * 1024 * 1024
+
+# How long a tail download that reached "today" is trusted before asking for new bars again
+REFRESH_SECONDS = 60
+
+# Relative difference between a re-downloaded bar and its cached copy taken as a revision
+# (a split or dividend adjusting the history) rather than float noise
+REVISION_TOLERANCE = 1e-6
+
+stats = {
+    'hits': 0,
+    'partial': 0,
+    'misses': 0,
+    'downloads': 0,
+    'revisions': 0,
+    # Running totals of the fetch times, the averages are taken in cache_stats
+    'cold_fetches': 0,
+    'cold_seconds': 0.0,
+    'warm_fetches': 0,
+    'warm_seconds': 0.0,
+}
+
+
+def _cache_path(ticker, interval, cache_dir=CACHE_DIR):
+    name = re.sub(r'[^A-Za-z0-9._^=-]', '_', f"{ticker}_{interval}")
+    return os.path.join(cache_dir, f"{name}.npz")
+
+
+def _day(date):
+    return pd.Timestamp(date).strftime("%Y-%m-%d")
+
+
+def load_bars(ticker, interval, cache_dir=CACHE_DIR):
+    """
+    Load cached bars for a ticker and interval.
+
+    :return: (DataFrame, metadata dict) or (None, None) when nothing is cached.
+    """
+    path = _cache_path(ticker, interval, cache_dir)
+    if not os.path.exists(path):
+        return None, None
+
+    with np.load(path, allow_pickle=False) as archive:
+        columns = archive['columns'].tolist()
+        tz = str(archive['tz'])
+        if tz:
+            index = pd.to_datetime(archive['index'], utc=True).tz_convert(tz)
+        else:
+            index = pd.DatetimeIndex(archive['index'].astype('datetime64[ns]'))
+        index.name = str(archive['index_name']) or None
+        frame = pd.DataFrame({column: archive[f'column_{i}'] for i, column in enumerate(columns)}, index=index)
+        metadata = {
+            'covered_start': str(archive['covered_start']),
+            'covered_end': str(archive['covered_end']),
+            'fetched_at': float(archive['fetched_at']),
+        }
+
+    # Mark as recently used for eviction
+    os.utime(path)
+    return frame, metadata
+
+
+def store_bars(ticker, interval, frame, covered_start, covered_end, cache_dir=CACHE_DIR):
+    """
+    Write bars for a ticker and interval, replacing what was cached before.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _cache_path(ticker, interval, cache_dir)
+
+    tz = str(frame.index.tz) if frame.index.tz is not None else ''
+    arrays = {f'column_{i}': frame[column].to_numpy() for i, column in enumerate(frame.columns)}
+
+    # Write to a temporary file first so readers never see a half written file. The name is
+    # unique per process and thread, so writers of the same ticker never share a temporary file.
+    temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary_path, 'wb') as file:
+        np.savez(
+            file,
+            index=frame.index.as_unit('ns').asi8,
+            tz=np.array(tz),
+            index_name=np.array(frame.index.name or ''),
+            columns=np.array([str(column) for column in frame.columns]),
+            covered_start=np.array(_day(covered_start)),
+            covered_end=np.array(_day(covered_end)),
+            fetched_at=np.array(time.time()),
+            **arrays
+        )
+    os.replace(temporary_path, path)
+
+
+def fetch_cached(ticker, start_date, end_date, interval, download, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    Serve bars from the local cache, downloading only what is missing.
+
+    :param download: Function (ticker, start_date, end_date, interval) -> DataFrame, called for the gaps.
+    :return: Bars from start_date up to, but not including, end_date (same convention as yf.download).
+    """
+    def download_many(tickers, start_date, end_date, interval):
+        return {ticker: download(ticker, start_date, end_date, interval) for ticker in tickers}
+
+    return fetch_cached_many([ticker], start_date, end_date, interval, download_many, cache_dir, max_bytes)[ticker]
+
+
+def fetch_cached_many(tickers, start_date, end_date, interval, download_many, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    fetch_cached for several tickers. Tickers missing the same date range are downloaded together,
+    so a cycle where every ticker only needs its latest bars is a single download call.
+
+    :param download_many: Function (tickers, start_date, end_date, interval) -> {ticker: DataFrame}.
+    :return: Dict of ticker -> bars from start_date up to, but not including, end_date.
+    """
+    start_time = time.perf_counter()
+    start_date = _day(start_date)
+    end_date = _day(end_date)
+
+    # Work out which date ranges each ticker is missing, grouped by range
+    plans = {}
+    missing = {}
+    for ticker in tickers:
+        cached, metadata = load_bars(ticker, interval, cache_dir)
+        plan = _plan(cached, metadata, start_date, end_date)
+        plans[ticker] = (cached, plan)
+        for date_range in plan['ranges']:
+            missing.setdefault(date_range, []).append(ticker)
+
+    downloaded = {ticker: [] for ticker in tickers}
+    for (range_start, range_end), range_tickers in missing.items():
+        stats['downloads'] += 1
+        frames = download_many(range_tickers, range_start, range_end, interval)
+        for ticker in range_tickers:
+            downloaded[ticker].append(frames.get(ticker, pd.DataFrame()))
+
+    # When the re-downloaded last day disagrees with the cache, the history was adjusted since
+    # it was cached: drop the cached bars and download the whole covered range again
+    revised = {}
+    for ticker in tickers:
+        cached, plan = plans[ticker]
+        if cached is not None and not cached.empty and _revised(cached, downloaded[ticker]):
+            stats['revisions'] += 1
+            try:
+                os.remove(_cache_path(ticker, interval, cache_dir))
+            except FileNotFoundError:
+                # Another writer already dropped it
+                pass
+            plans[ticker] = (None, plan)
+            downloaded[ticker] = []
+            revised.setdefault((plan['covered_start'], plan['covered_end']), []).append(ticker)
+
+    for (range_start, range_end), range_tickers in revised.items():
+        stats['downloads'] += 1
+        frames = download_many(range_tickers, range_start, range_end, interval)
+        for ticker in range_tickers:
+            downloaded[ticker].append(frames.get(ticker, pd.DataFrame()))
+
+    results = {}
+    cold = False
+    stored = False
+    for ticker in tickers:
+        cached, plan = plans[ticker]
+        # An empty download (a failed request, or no bars yet) must not mark its range as covered
+        fetched = [frame for frame in downloaded[ticker] if not frame.empty]
+        parts = [frame for frame in [cached] + fetched if frame is not None and not frame.empty]
+
+        if not parts:
+            # Nothing cached and nothing downloaded
+            stats['misses'] += 1
+            cold = True
+            results[ticker] = downloaded[ticker][0] if downloaded[ticker] else pd.DataFrame()
+            continue
+
+        if cached is None or cached.empty:
+            stats['misses'] += 1
+            cold = True
+        elif fetched:
+            stats['partial'] += 1
+        else:
+            stats['hits'] += 1
+
+        if fetched:
+            stored = True
+            # A stable sort, so the downloaded copy of a bar comes after the cached one and is kept
+            frame = pd.concat(parts).sort_index(kind='stable')
+            frame = frame[~frame.index.duplicated(keep='last')]
+            store_bars(ticker, interval, frame, plan['covered_start'], plan['covered_end'], cache_dir)
+        else:
+            frame = cached
+        results[ticker] = _slice(frame, start_date, end_date)
+
+    if stored:
+        evict(max_bytes, cache_dir)
+
+    kind = 'cold' if cold else 'warm'
+    stats[f'{kind}_fetches'] += 1
+    stats[f'{kind}_seconds'] += time.perf_counter() - start_time
+    return results
+
+
+def _plan(cached, metadata, start_date, end_date):
+    """
+    Date ranges to download so the cache covers start_date to end_date, and the range covered afterwards.
+    """
+    if cached is None or cached.empty:
+        return {'ranges': [(start_date, end_date)], 'covered_start': start_date, 'covered_end': end_date}
+
+    ranges = []
+    covered_start = metadata['covered_start']
+    covered_end = metadata['covered_end']
+
+    # Missing history before the cached range
+    if start_date < covered_start:
+        ranges.append((start_date, covered_start))
+        covered_start = start_date
+
+    # Missing (or still forming) bars after the cached range. The last cached day is
+    # downloaded again because its last bar may not have been final yet.
+    last_day = cached.index[-1].strftime("%Y-%m-%d")
+    recently_fetched = time.time() - metadata['fetched_at'] < REFRESH_SECONDS
+    final = covered_end <= _day(pd.Timestamp.now()) or recently_fetched
+    if end_date > covered_end or (not final and end_date > last_day):
+        ranges.append((last_day, end_date))
+        covered_end = max(covered_end, end_date)
+
+    return {'ranges': ranges, 'covered_start': covered_start, 'covered_end': covered_end}
+
+
+def _revised(cached, frames, tolerance=REVISION_TOLERANCE):
+    """
+    Whether bars downloaded again differ from their cached copies. The last cached bar may
+    still have been forming, so only its open and its Adj Close / Close ratio are compared.
+    """
+    last_bar = cached.index[-1]
+    for frame in frames:
+        if frame.empty:
+            continue
+        overlap = cached.index.intersection(frame.index)
+        if overlap.empty:
+            continue
+        old = cached.loc[overlap]
+        new = frame[~frame.index.duplicated(keep='last')].loc[overlap]
+        final = overlap < last_bar
+
+        for column in ['Open', 'High', 'Low', 'Close', 'Adj Close']:
+            if column not in old.columns or column not in new.columns:
+                continue
+            compared = slice(None) if column == 'Open' else final
+            if not np.allclose(old[column].to_numpy()[compared], new[column].to_numpy()[compared], rtol=tolerance, atol=0, equal_nan=True):
+                return True
+
+        if {'Adj Close', 'Close'} <= set(old.columns) & set(new.columns):
+            old_ratio = old['Adj Close'].to_numpy()[-1] / old['Close'].to_numpy()[-1]
+            new_ratio = new['Adj Close'].to_numpy()[-1] / new['Close'].to_numpy()[-1]
+            if not np.isclose(old_ratio, new_ratio, rtol=tolerance, atol=0, equal_nan=True):
+                return True
+    return False
+
+
+def _slice(frame, start_date, end_date):
+    # end_date is exclusive, like yf.download
+    last_day = _day(pd.Timestamp(end_date) - pd.Timedelta(days=1))
+    # Callers add indicator columns to the frame, so hand out a copy
+    return frame.loc[start_date:last_day].copy()
+
+
+def invalidate(ticker=None, interval=None, cache_dir=CACHE_DIR):
+    """
+    Remove cached bars. With no ticker or interval everything matching is removed.
+
+    :return: Number of files removed.
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    ticker_prefix = os.path.basename(_cache_path(ticker, '', cache_dir))[:-len('.npz')]
+    removed = 0
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.npz'):
+            continue
+        if ticker is not None and not name.startswith(ticker_prefix):
+            continue
+        if interval is not None and not name.endswith(f"_{interval}.npz"):
+            continue
+        os.remove(os.path.join(cache_dir, name))
+        removed += 1
+    return removed
+
+
+def cache_size(cache_dir=CACHE_DIR):
+    if not os.path.isdir(cache_dir):
+        return 0
+    return sum(entry.stat().st_size for entry in os.scandir(cache_dir) if entry.name.endswith('.npz'))
+
+
+def evict(max_bytes=MAX_CACHE_BYTES, cache_dir=CACHE_DIR):
+    """
+    Remove the least recently used files until the cache fits in max_bytes.
+
+    :return: Number of files removed.
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    entries = [entry for entry in os.scandir(cache_dir) if entry.name.endswith('.npz')]
+    total = sum(entry.stat().st_size for entry in entries)
+    removed = 0
+    for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+        if total <= max_bytes:
+            break
+        total -= entry.stat().st_size
+        os.remove(entry.path)
+        removed += 1
+    return removed
+
+
+def cache_stats():
+    """
+    Hit/miss counters and the average cold (nothing cached) and warm (served from the cache) fetch times.
+    """
+    summary = {key: stats[key] for key in ['hits', 'partial', 'misses', 'downloads', 'revisions']}
+    for kind in ['cold', 'warm']:
+        fetches = stats[f'{kind}_fetches']
+        summary[f'{kind}_seconds'] = stats[f'{kind}_seconds'] / fetches if fetches else None
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local OHLCV cache')
+    parser.add_argument('--clear', action='store_true', help='Remove cached bars (all, or only --ticker/--interval)')
+    parser.add_argument('--ticker', help='Ticker to clear')
+    parser.add_argument('--interval', help='Interval to clear')
+    parser.add_argument('--max-mb', type=float, help='Evict least recently used files above this size')
+    args = parser.parse_args()
+
+    if args.clear:
+        print(f"Removed {invalidate(args.ticker, args.interval)} cached files")
+    if args.max_mb is not None:
+        print(f"Evicted {evict(int(args.max_mb * 1024 * 1024))} cached files")
+    print(f"Cache size: {cache_size() / (1024 * 1024):.1f} MB in {CACHE_DIR}")
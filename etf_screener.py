@@ -1,13 +1,121 @@
-import requests
-from bs4 import BeautifulSoup
-import yfinance as yf
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
+import market_data
+
+ETF_URL = "https://finance.yahoo.com/markets/etfs/best-historical-performance/"  # Example URL (may need updating)
+
+# Scraped ticker lists and info payloads, one JSON file each
+CACHE_DIR = '.etf_cache'
+TICKERS_TTL = 24 * 60 * 60
+INFO_TTL = 6 * 60 * 60
+
+# Info requests: at most MAX_WORKERS at the same time and RATE_LIMIT started per second
+MAX_WORKERS = 8
+RATE_LIMIT = 5.0
+RETRIES = 3
+BACKOFF_SECONDS = 0.5
+
+# Fields kept from every info payload
+INFO_FIELDS = ['Price', 'Change', '50 Day Average', '200 Day Average']
+
+stats = {
+    'cached': 0,
+    'fetched': 0,
+    'retries': 0,
+    'failed': 0,
+}
+stats_lock = threading.Lock()
+
+
+class RateLimiter:
+    """
+    Spaces calls of wait() at least 1 / rate seconds apart, across threads.
+    A rate of 0 or None does not limit.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        time.sleep(start - now)
+
+
+def _count(name):
+    with stats_lock:
+        stats[name] += 1
+
+
+def _cache_path(name, cache_dir=CACHE_DIR):
+    name = re.sub(r'[^A-Za-z0-9._^=-]', '_', name)
+    return os.path.join(cache_dir, f"{name}.json")
+
+
+def _read_cache(name, ttl, cache_dir=CACHE_DIR):
+    # Payload stored under name, or None when missing, unreadable or older than ttl seconds
+    try:
+        with open(_cache_path(name, cache_dir)) as file:
+            cached = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if time.time() - cached['fetched_at'] > ttl:
+        return None
+    return cached['payload']
+
+
+def _write_cache(name, payload, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _cache_path(name, cache_dir)
+
+    # Write to a temporary file first so readers never see a half written file; the pid and
+    # thread id keep concurrent screener runs and info threads on separate temporary files
+    temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary_path, 'w') as file:
+        json.dump({'fetched_at': time.time(), 'payload': payload}, file, default=str)
+    os.replace(temporary_path, path)
+
+
+def _read_page(source):
+    # source is a URL or the path of a saved page (a local stand-in for tests)
+    if os.path.exists(source):
+        with open(source, encoding='utf-8') as file:
+            return file.read()
+
+    import requests
+    response = requests.get(source)
+    response.raise_for_status()
+    return response.text
+
+
+def get_etf_tickers(source=ETF_URL, ttl=TICKERS_TTL, cache_dir=CACHE_DIR):
+    """
+    Tickers in the first table of the page at source (URL or local file). The list is cached
+    for ttl seconds; a ttl of 0 scrapes the page again.
+    """
+    cache_name = f"tickers_{source}"
+    if ttl:
+        tickers = _read_cache(cache_name, ttl, cache_dir)
+        if tickers is not None:
+            return tickers
+
+    # Only needed when the tickers are scraped, not with a replay directory
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(_read_page(source), 'html.parser')
 
-def get_etf_tickers():
-    url = "https://finance.yahoo.com/markets/etfs/best-historical-performance/"  # Example URL (may need updating)
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
     tickers = []
     # Find the table containing ETF symbols
     table = soup.find("table")  # Find the first table on the page
@@ -18,49 +126,107 @@ def get_etf_tickers():
                 # Assuming the first column in each row is the ticker symbol
                 ticker = columns[0].text.strip()
                 tickers.append(ticker)
-    
+
+    # An empty list is a page that changed layout or failed to render, scrape it again next time
+    if tickers:
+        _write_cache(cache_name, tickers, cache_dir)
     return tickers
 
-def fetch_etf_data(tickers):
-    etf_data = []
-    for ticker in tickers:
+
+def fetch_info(ticker, limiter=None, retries=RETRIES, backoff=BACKOFF_SECONDS):
+    """
+    Provider info of one ticker, retried up to `retries` times with an exponential backoff.
+    """
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.wait()
         try:
-            etf = yf.Ticker(ticker)
-            info = etf.info
-            etf_data.append({
-                'Ticker': ticker,
-                'Price': info.get('Price'),
-                'Change': info.get('Change'),
-                '50 Day Average': info.get('50 Day Average'),
-                '200 Day Average': info.get('200 Day Average'),
-            })
+            return market_data.get_provider().info(ticker)
+        except FileNotFoundError:
+            # Not recorded in the replay directory, asking again will not help
+            raise
+        except Exception:
+            if attempt == retries:
+                raise
+            _count('retries')
+            time.sleep(backoff * 2 ** attempt)
+
+
+def _fetch_row(ticker, limiter, retries, ttl, cache_dir, use_cache):
+    # A ttl of 0 fetches again, and still refreshes the cache
+    info = _read_cache(f"info_{ticker}", ttl, cache_dir) if use_cache and ttl else None
+    if info is not None:
+        _count('cached')
+    else:
+        try:
+            info = fetch_info(ticker, limiter, retries)
         except Exception as e:
             print(f"Error fetching data for {ticker}: {e}")
-    return etf_data
+            _count('failed')
+            return None
+        _count('fetched')
+        if use_cache:
+            _write_cache(f"info_{ticker}", {field: info.get(field) for field in INFO_FIELDS}, cache_dir)
+
+    row = {'Ticker': ticker}
+    row.update({field: info.get(field) for field in INFO_FIELDS})
+    return row
+
+
+def fetch_etf_data(tickers, max_workers=MAX_WORKERS, rate=RATE_LIMIT, retries=RETRIES, ttl=INFO_TTL, cache_dir=CACHE_DIR):
+    """
+    Info fields of every ticker, fetched on max_workers threads and at most `rate` requests
+    per second. Info is cached for ttl seconds (not with a provider serving local files);
+    a ttl of 0 fetches every ticker again.
+
+    :return: DataFrame with a row per ticker that could be fetched, in tickers order.
+    """
+    use_cache = market_data.get_provider().cacheable
+    limiter = RateLimiter(rate)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        rows = list(executor.map(lambda ticker: _fetch_row(ticker, limiter, retries, ttl, cache_dir, use_cache), tickers))
+
+    return pd.DataFrame([row for row in rows if row is not None], columns=['Ticker'] + INFO_FIELDS)
+
 
 def filter_etfs(etf_data, min=0, max=float('inf')):
-    return [
-        etf for etf in etf_data
-        if etf['Price'] is not None and min <= etf['Price'] <= max
-    ]
+    # etf_data: DataFrame from fetch_etf_data, or a list of its rows
+    etf_data = pd.DataFrame(etf_data, columns=['Ticker'] + INFO_FIELDS)
+    price = pd.to_numeric(etf_data['Price'], errors='coerce')
+    return etf_data[price.between(min, max)].reset_index(drop=True)
 
 
-def main():
-    # Fetch ETF tickers
-    etf_tickers = get_etf_tickers()
-    
-    # Fetch ETF data for tickers
-    etf_data = fetch_etf_data(etf_tickers)
+def main(source=ETF_URL, min_price=0, max_price=200, max_workers=MAX_WORKERS, rate=RATE_LIMIT, retries=RETRIES, refresh=False):
+    tickers_ttl, info_ttl = (0, 0) if refresh else (TICKERS_TTL, INFO_TTL)
 
-    # Filter the ETFs based on NAV and other criteria
-    filtered_etfs = filter_etfs(etf_data, min=0, max=200)
+    # Fetch ETF tickers, or use the recorded ones when replaying
+    etf_tickers = market_data.get_provider().tickers()
+    if etf_tickers is None:
+        etf_tickers = get_etf_tickers(source, tickers_ttl)
 
-    #print(filtered_etfs)
+    # Fetch ETF data for tickers
+    start_time = time.perf_counter()
+    etf_data = fetch_etf_data(etf_tickers, max_workers, rate, retries, info_ttl)
+    print(f"{len(etf_tickers)} tickers in {time.perf_counter() - start_time:.1f}s "
+          f"({stats['cached']} cached, {stats['fetched']} fetched, {stats['retries']} retries, {stats['failed']} failed)")
 
-    # # Convert to DataFrame and save as CSV
-    df = pd.DataFrame(filtered_etfs)
+    # Filter the ETFs based on NAV and other criteria
+    df = filter_etfs(etf_data, min=min_price, max=max_price)
     print(df)
     # df.to_csv("filtered_etfs.csv", index=False)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='ETF screener')
+    parser.add_argument('--page', default=ETF_URL, help='URL or saved HTML file of the page listing the ETFs')
+    parser.add_argument('--min', type=float, default=0, help='Minimum price (default: 0)')
+    parser.add_argument('--max', type=float, default=200, help='Maximum price (default: 200)')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help=f'Info requests in flight at the same time (default: {MAX_WORKERS})')
+    parser.add_argument('--rate', type=float, default=RATE_LIMIT, help=f'Info requests started per second, 0 for no limit (default: {RATE_LIMIT})')
+    parser.add_argument('--retries', type=int, default=RETRIES, help=f'Retries of a failed info request (default: {RETRIES})')
+    parser.add_argument('--refresh', action='store_true', help=f'Ignore the cached ticker list and info in {CACHE_DIR}')
+    market_data.add_arguments(parser)
+    args = parser.parse_args()
+
+    market_data.configure(args.replay, args.latency, args.jitter)
+    main(args.page, args.min, args.max, args.workers, args.rate, args.retries, args.refresh)
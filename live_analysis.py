@@ -0,0 +1,391 @@
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import tech_analysis_tools
+import main_analysis
+
+# Bars looked at for the indicators with a fixed window (SMA 200 for the golden cross is the longest)
+TAIL_BARS = 260
+
+# Bars before the first new bar needed to recompute RSI there (14 bar window, a diff, and the 2 bars divergence looks back)
+RSI_MARGIN = 20
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def _ewm_alpha(span):
+    # Same smoothing factor as Series.ewm(span=span)
+    return 1.0 / (1.0 + (span - 1) / 2)
+
+
+def _ewm_step(weighted, value, alpha):
+    # One step of Series.ewm(adjust=False).mean(), with the same float operations as pandas
+    if weighted != value:
+        weighted = ((1.0 - alpha) * weighted + alpha * value) / ((1.0 - alpha) + alpha)
+    return weighted
+
+
+class LiveSymbol:
+    """
+    Bars and indicator state of one symbol, advanced bar by bar as new bars arrive.
+
+    EMA/MACD, VWAP, Parabolic SAR and the pattern detectors keep their running state, so a
+    new bar costs the same however long the history is. Indicators with a fixed window (RSI,
+    Bollinger Bands, Stochastic, ADX, volume and golden cross) are recomputed on the last
+    TAIL_BARS bars only. The statuses are the ones analyze_stock gives for the same bars.
+    """
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.frame = None
+        self.state = None
+        # State as of the bar before the last one, to redo the last bar when it gets revised
+        self.previous_state = None
+        self.weights = None
+        self.analysis = None
+
+    def update(self, frame, weights):
+        """
+        Take the latest bars of the symbol and re-score it if anything changed.
+
+        :return: True when the analysis was recomputed.
+        """
+        if not np.isfinite(frame[PRICE_COLUMNS].to_numpy(dtype=float)).all():
+            # The running EMA/MACD and VWAP sums would carry a missing value into every later bar,
+            # so a frame with gaps is scored from scratch and the next update starts over
+            self.frame = frame
+            self.state = None
+            self.previous_state = None
+            self.weights = weights
+            self.analysis = main_analysis.analyze_stock(frame.copy(), weights)
+            return True
+
+        if self.frame is None or self.state is None or len(frame) < len(self.frame):
+            start = 0
+        else:
+            start = _first_changed_bar(self.frame, frame)
+            if start == len(frame) == len(self.frame):
+                if weights == self.weights:
+                    return False
+            elif start == len(self.frame) - 1:
+                # Only the last bar changed (it was still forming) and maybe new bars came after it
+                self.state = self.previous_state
+            elif start < len(self.frame):
+                # Older bars changed, or the window moved forward: start over
+                start = 0
+
+        self.frame = frame
+        if start < len(frame):
+            self._advance(start)
+        self.weights = weights
+        self.analysis = self._analyze(weights)
+        return True
+
+    def _advance(self, start):
+        frame = self.frame
+        if start == 0:
+            self.state = None
+
+        # Per-bar inputs of the new bars, computed on the few bars they depend on
+        begin = max(start - RSI_MARGIN, 0)
+        window = frame.iloc[begin:]
+        rsi = tech_analysis_tools.calculate_rsi(window).to_numpy(dtype=float)
+        candle_codes = tech_analysis_tools.candlestick_pattern_codes(window)
+        high_window = window['High'].to_numpy(dtype=float)
+        low_window = window['Low'].to_numpy(dtype=float)
+        peak_positions = tech_analysis_tools._window_extreme_positions(high_window, 5, True)
+        trough_positions = tech_analysis_tools._window_extreme_positions(low_window, 5, False)
+
+        high = frame['High'].to_numpy(dtype=float).tolist()
+        low = frame['Low'].to_numpy(dtype=float).tolist()
+        close = frame['Close'].to_numpy(dtype=float).tolist()
+        volume = frame['Volume'].to_numpy(dtype=float).tolist()
+
+        state = dict(self.state) if self.state is not None else None
+        for i in range(start, len(frame)):
+            if i == len(frame) - 1:
+                self.previous_state = state
+            j = i - begin
+            typical_price = (high[i] + low[i] + close[i]) / 3
+
+            if state is None:
+                state = {
+                    'ema_fast': close[i], 'ema_slow': close[i], 'macd_signal': 0.0,
+                    'macd_histogram': 0.0, 'previous_macd_histogram': None,
+                    'price_volume': typical_price * volume[i], 'volume': volume[i],
+                    'uptrend': True, 'af': 0.02, 'ep': low[i], 'sar': high[i], 'previous_sar': None,
+                    'candlestick': tech_analysis_tools.NO_PATTERN, 'divergence': tech_analysis_tools.NO_DIVERGENCE,
+                    'peaks': (), 'troughs': (), 'peak_positions': (), 'trough_positions': (),
+                }
+                continue
+
+            state = dict(state)
+
+            # EMA / MACD
+            state['ema_fast'] = _ewm_step(state['ema_fast'], close[i], _ewm_alpha(12))
+            state['ema_slow'] = _ewm_step(state['ema_slow'], close[i], _ewm_alpha(26))
+            macd_line = state['ema_fast'] - state['ema_slow']
+            state['macd_signal'] = _ewm_step(state['macd_signal'], macd_line, _ewm_alpha(9))
+            state['previous_macd_histogram'] = state['macd_histogram']
+            state['macd_histogram'] = macd_line - state['macd_signal']
+
+            # VWAP
+            state['price_volume'] = state['price_volume'] + typical_price * volume[i]
+            state['volume'] = state['volume'] + volume[i]
+
+            # Parabolic SAR, same steps as parabolic_sar_array
+            state['previous_sar'] = state['sar']
+            step, max_step = 0.02, 0.2
+            uptrend, af, ep, sar = state['uptrend'], state['af'], state['ep'], state['sar']
+            if uptrend:
+                sar = sar + af * (ep - sar)
+                if close[i] < sar:
+                    uptrend, sar, af, ep = False, ep, step, low[i]
+            else:
+                sar = sar - af * (sar - ep)
+                if close[i] > sar:
+                    uptrend, sar, af, ep = True, ep, step, high[i]
+            if uptrend:
+                if high[i] > ep:
+                    ep = high[i]
+                    af = min(af + step, max_step)
+            else:
+                if low[i] < ep:
+                    ep = low[i]
+                    af = min(af + step, max_step)
+            state.update(uptrend=uptrend, af=af, ep=ep, sar=sar)
+
+            # Candlestick pattern
+            if candle_codes[j]:
+                state['candlestick'] = int(candle_codes[j])
+
+            if i >= 2:
+                high_peak = high[i - 1] > high[i - 2] and high[i - 1] > high[i]
+                low_trough = low[i - 1] < low[i - 2] and low[i - 1] < low[i]
+
+                # RSI divergence, same rules as rsi_divergence_history
+                if high_peak and rsi[j - 1] > rsi[j - 2] and rsi[j - 1] > rsi[j]:
+                    if high[i] > high[i - 2] and rsi[j] < rsi[j - 2]:
+                        state['divergence'] = tech_analysis_tools.BEARISH_DIVERGENCE
+                    elif low[i] < low[i - 2] and rsi[j] > rsi[j - 2]:
+                        state['divergence'] = tech_analysis_tools.BULLISH_DIVERGENCE
+
+                # Head and Shoulders: the last 3 peaks and troughs
+                if high_peak:
+                    state['peaks'] = (state['peaks'] + (high[i - 1],))[-3:]
+                if low_trough:
+                    state['troughs'] = (state['troughs'] + (low[i - 1],))[-3:]
+
+            # Double Top/Bottom: the last 2 window extreme positions
+            if not np.isnan(peak_positions[j]):
+                state['peak_positions'] = (state['peak_positions'] + (int(peak_positions[j]),))[-2:]
+            if not np.isnan(trough_positions[j]):
+                state['trough_positions'] = (state['trough_positions'] + (int(trough_positions[j]),))[-2:]
+
+        self.state = state
+
+    def _analyze(self, weights):
+        frame = self.frame
+        state = self.state
+        tail = frame.iloc[-TAIL_BARS:].copy()
+        current_price = frame['Close'].iloc[-1]
+
+        latest_rsi = tech_analysis_tools.calculate_rsi(tail).iloc[-1]
+        if latest_rsi > 70:
+            rsi_status = tech_analysis_tools.OVERBOUGHT
+        elif latest_rsi < 30:
+            rsi_status = tech_analysis_tools.OVERSOLD
+        else:
+            rsi_status = tech_analysis_tools.NEUTRAL_ZONE
+
+        if state['ema_fast'] - state['ema_slow'] > state['macd_signal']:
+            macd_status = tech_analysis_tools.MACD_BULLISH
+        else:
+            macd_status = tech_analysis_tools.MACD_BEARISH
+
+        macd_histogram_status = tech_analysis_tools.NO_REVERSAL
+        previous_macd_histogram = state['previous_macd_histogram']
+        latest_macd_histogram = state['macd_histogram']
+        if previous_macd_histogram is not None:
+            if previous_macd_histogram < 0 and latest_macd_histogram >= 0:
+                macd_histogram_status = tech_analysis_tools.MACD_REVERSAL_BULLISH
+            elif previous_macd_histogram > 0 and latest_macd_histogram <= 0:
+                macd_histogram_status = tech_analysis_tools.MACD_REVERSAL_BEARISH
+
+        vwap = state['price_volume'] / state['volume']
+        if current_price < vwap:
+            vwap_status = tech_analysis_tools.UNDER_VWAP
+        else:
+            vwap_status = tech_analysis_tools.OVER_VWAP
+
+        if tech_analysis_tools.check_golden_cross(tail):
+            golden_cross_status = tech_analysis_tools.GOLDEN_CROSS
+        else:
+            golden_cross_status = tech_analysis_tools.NO_GOLDEN_CROSS
+
+        previous_close = frame['Close'].iloc[-2]
+        if current_price > state['sar'] and state['previous_sar'] >= previous_close:
+            parabolic_sar_status = tech_analysis_tools.SAR_REVERSAL_UP
+        elif current_price < state['sar'] and state['previous_sar'] <= previous_close:
+            parabolic_sar_status = tech_analysis_tools.SAR_REVERSAL_DOWN
+        else:
+            parabolic_sar_status = tech_analysis_tools.SAR_NO_REVERSAL
+
+        volume_trend = tech_analysis_tools.volume_trend_signal(tail)
+
+        bollinger_upper, bollinger_lower = tech_analysis_tools.calculate_bollinger_bands(tail)
+        if current_price >= bollinger_upper.iloc[-1]:
+            bollinger_status = tech_analysis_tools.NEAR_UPPER_BAND
+        elif current_price <= bollinger_lower.iloc[-1]:
+            bollinger_status = tech_analysis_tools.NEAR_LOWER_BAND
+        else:
+            bollinger_status = tech_analysis_tools.WITHIN_BANDS
+
+        stochastic_k, stochastic_d = tech_analysis_tools.calculate_stochastic_oscillator(tail)
+        if stochastic_k.iloc[-1] > 80 and stochastic_d.iloc[-1] > 80:
+            stochastic_status = tech_analysis_tools.OVERBOUGHT
+        elif stochastic_k.iloc[-1] < 20 and stochastic_d.iloc[-1] < 20:
+            stochastic_status = tech_analysis_tools.OVERSOLD
+        else:
+            stochastic_status = tech_analysis_tools.NEUTRAL_ZONE
+
+        if tech_analysis_tools.calculate_adx(tail).iloc[-1] >= 25:
+            adx_status = macd_status
+        else:
+            adx_status = rsi_status
+
+        head_and_shoulder_detect = tech_analysis_tools.NO_HEAD_AND_SHOULDERS
+        if len(state['peaks']) == 3 and len(state['troughs']) == 3:
+            left_peak, head_peak, right_peak = state['peaks']
+            left_trough, head_trough, right_trough = state['troughs']
+            if left_peak < head_peak > right_peak and left_trough < head_trough < right_trough:
+                head_and_shoulder_detect = tech_analysis_tools.HEAD_AND_SHOULDERS
+            elif left_peak > head_peak < right_peak and left_trough > head_trough < right_trough:
+                head_and_shoulder_detect = tech_analysis_tools.INVERSE_HEAD_AND_SHOULDERS
+
+        # Like detect_double_top_bottom, the window positions are looked up from the start of the data
+        double_top_bottom = tech_analysis_tools.NO_DOUBLE_TOP_BOTTOM
+        high = frame['High']
+        low = frame['Low']
+        if len(state['peak_positions']) == 2 and \
+                abs(high.iloc[state['peak_positions'][0]] - high.iloc[state['peak_positions'][1]]) / high.iloc[state['peak_positions'][0]] < 0.02:
+            double_top_bottom = tech_analysis_tools.DOUBLE_TOP
+        elif len(state['trough_positions']) == 2 and \
+                abs(low.iloc[state['trough_positions'][0]] - low.iloc[state['trough_positions'][1]]) / low.iloc[state['trough_positions'][0]] < 0.02:
+            double_top_bottom = tech_analysis_tools.DOUBLE_BOTTOM
+
+        indicators = {
+            'RSI_Status': rsi_status,
+            'MACD_Status': macd_status,
+            'ADX_Status': adx_status,
+            'MACD_Histogram_Status': macd_histogram_status,
+            'VWAP_Status': vwap_status,
+            'Golden_Cross_Status': golden_cross_status,
+            'Parabolic_SAR_Status': parabolic_sar_status,
+            'Volume_Trend': volume_trend,
+            'Bollinger_Status': bollinger_status,
+            'Stochastic_Status': stochastic_status,
+            'CandleStick_Pattern_Status': state['candlestick'],
+            'Divergance_status': state['divergence'],
+            'Head_and_Shoulder_detect': head_and_shoulder_detect,
+            'Double_Top_Bottom': double_top_bottom,
+            # Running high/low over the whole window, a single vectorized max/min
+            'fibonacci_signal': tech_analysis_tools.fibonacci_signal(frame),
+        }
+        weigth_scores, decision = main_analysis.weighted_decision(indicators, weights)
+
+        return {
+            'RSI': latest_rsi,
+            'RSI_Status': rsi_status,
+            'MACD_Status': macd_status,
+            'ADX_Status': adx_status,
+            'MACD_Histogram_Status': macd_histogram_status,
+            'VWAP': vwap,
+            'VWAP_Status': vwap_status,
+            'Golden_Cross_Status': golden_cross_status,
+            'Volume_Trend': volume_trend,
+            'Parabolic_SAR_Status': parabolic_sar_status,
+            'Bollinger_Status': bollinger_status,
+            'Stochastic_Status': stochastic_status,
+            'CandleStick_Pattern_Status': indicators['CandleStick_Pattern_Status'],
+            'Decision': decision,
+            'Current_Price': current_price,
+            'weigth_scores': weigth_scores,
+            'Price_Drop': tech_analysis_tools.analyze_price_drop(frame, drop_threshold=0.20),
+            'Divergance_status': indicators['Divergance_status'],
+            'Head_and_Shoulder_detect': head_and_shoulder_detect,
+            'Double_Top_Bottom': double_top_bottom,
+            'fibonacci_signal': indicators['fibonacci_signal'],
+        }
+
+
+def _first_changed_bar(old, new):
+    """
+    Position of the first bar that differs between two frames of the same symbol
+    (the length of the shorter one when one only extends the other).
+    """
+    count = min(len(old), len(new))
+    same_index = old.index[:count] == new.index[:count]
+    same_values = (old[PRICE_COLUMNS].to_numpy()[:count] == new[PRICE_COLUMNS].to_numpy()[:count]).all(axis=1)
+    changed = np.flatnonzero(~(same_index & same_values))
+    return int(changed[0]) if len(changed) else count
+
+
+def live_cycle(live_symbols, qdays, interval, weights, max_workers=main_analysis.MAX_WORKERS):
+    """
+    Fetch the latest bars of the portfolio and re-score only the symbols whose bars changed.
+
+    :param live_symbols: Dict of symbol -> LiveSymbol for this interval, kept between cycles.
+    :return: Number of symbols that were re-scored.
+    """
+    cpu_start = time.process_time()
+    date_back = datetime.now() - timedelta(days=qdays)
+    today = datetime.now() + timedelta(days=1)
+    start_date = date_back.strftime("%Y-%m-%d")
+    end_date = today.strftime("%Y-%m-%d")
+
+    portfolio_data = main_analysis.load_portfolio()
+    symbols = portfolio_data['Symbol'].tolist()
+
+    try:
+        stock_data = main_analysis.fetch_many_stock_data(symbols, start_date, end_date, interval, progress=False, max_workers=max_workers)
+    except Exception as e:
+        print(f"Could not fetch portfolio data: {e}")
+        return 0
+
+    updated = 0
+    for index, row in portfolio_data.iterrows():
+        symbol = row['Symbol']
+        live_symbol = live_symbols.setdefault(symbol, LiveSymbol(symbol))
+        try:
+            if stock_data[symbol].empty or not live_symbol.update(stock_data[symbol], weights):
+                continue
+        except Exception as e:
+            print(f"\nCould not analyze {symbol}: {e}")
+            continue
+
+        updated += 1
+        main_analysis.print_analysis(symbol, live_symbol.analysis, row['STATUS'], row['PURCHASE _DATE'], row['PURCHASE_PRICE'], row['PURCHASE_QTY'])
+
+    print(f"\n{interval} chart: {updated} of {len(symbols)} symbols updated, {time.process_time() - cpu_start:.3f}s CPU")
+    return updated
+
+
+def run_live(charts, max_workers=main_analysis.MAX_WORKERS, poll_seconds=600, after_cycle=None):
+    """
+    Live mode of the real-time loop: the bars and indicator state of every symbol stay in
+    memory, and each cycle only processes the bars that arrived since the previous one.
+
+    :param charts: List of (qdays, interval, weights), one per chart to follow.
+    :param poll_seconds: Seconds to wait between cycles.
+    :param after_cycle: Function called with no arguments after every cycle.
+    """
+    live_symbols = {interval: {} for _, interval, _ in charts}
+    while True:
+        for qdays, interval, weights in charts:
+            live_cycle(live_symbols[interval], qdays, interval, weights, max_workers)
+        if after_cycle is not None:
+            after_cycle()
+        print("***********************************************************")
+        print(f"{poll_seconds / 60:.0f} minutes before running again...")
+        time.sleep(poll_seconds)
@@ -1,130 +1,236 @@
 import sys
-import yfinance as yf
 import pandas as pd
+import numpy as np
 import warnings
 from datetime import datetime, timedelta
-import colorama
-from colorama import Fore, Style
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import repeat
 import tech_analysis_tools
-import back_test
+import data_cache
+import market_data
+import profiling
+import result_cache
+import sheet_cache
+import timeframes
 import argparse
-import pprint  # Import pprint for pretty printing
+
+# back_test (and bayes_opt through it) and colorama are imported where they are used,
+# so importing this module, in a worker process for example, stays cheap
 
 # Suppress the specific warning from yfinance
 warnings.filterwarnings("ignore", category=FutureWarning, module="yfinance")
 
-# Initialize colorama
-colorama.init()
+# Backtest portfolio and whole portfolio spreadsheets
+BACKTEST_GROUP_FILE = 'backtest_group.xlsx'
+PORTFOLIO_FILE = 'portfolio.xlsx'
+
+def load_backtest_group():
+    # Parsed on first use and reused until the spreadsheet changes
+    return sheet_cache.load_sheet(BACKTEST_GROUP_FILE)
+
+def load_portfolio():
+    return sheet_cache.load_sheet(PORTFOLIO_FILE)
+
+# Default number of symbols fetched and analyzed at the same time
+MAX_WORKERS = 4
+
+# Exit rule of backtest_analysis, also used by the walk-forward check of its weights
+BACKTEST_PROFIT_THRESHOLD = 0.04
+BACKTEST_STOP_LOSS_THRESHOLD = 0.02
+
+@profiling.profiled('download')
+def download_stock_data(ticker, start_date, end_date, interval, progress=False):
+    return market_data.get_provider().download(ticker, start_date, end_date, interval, progress)
+
+@profiling.profiled('download')
+def download_many_stock_data(tickers, start_date, end_date, interval, progress=False, max_workers=MAX_WORKERS):
+    """
+    Download several tickers in one batched call, using at most max_workers threads.
+
+    :return: Dict of ticker -> DataFrame (empty when the download failed for that ticker).
+    """
+    return market_data.get_provider().download_many(tickers, start_date, end_date, interval, progress, max_workers)
+
+@profiling.profiled('fetch')
+def fetch_stock_data(ticker, start_date, end_date, interval, progress=False, use_cache=True):
+    # Served from the local OHLCV cache, which only downloads the bars it does not have yet
+    if use_cache and market_data.get_provider().cacheable:
+        return data_cache.fetch_cached(
+            ticker, start_date, end_date, interval,
+            download=lambda ticker, start, end, interval: download_stock_data(ticker, start, end, interval, progress)
+        )
+    return download_stock_data(ticker, start_date, end_date, interval, progress)
+
+@profiling.profiled('fetch')
+def fetch_many_stock_data(tickers, start_date, end_date, interval, progress=False, max_workers=MAX_WORKERS):
+    # Same as fetch_stock_data for a list of tickers, with the missing bars of all of them in one batched download
+    if not market_data.get_provider().cacheable:
+        return download_many_stock_data(tickers, start_date, end_date, interval, progress, max_workers)
+    return data_cache.fetch_cached_many(
+        tickers, start_date, end_date, interval,
+        download_many=lambda tickers, start, end, interval: download_many_stock_data(tickers, start, end, interval, progress, max_workers)
+    )
+
+def fetch_timeframes(tickers, periods, progress=False, max_workers=MAX_WORKERS):
+    """
+    Bars of several timeframes from one download of the finest interval. The coarser bars are
+    resampled locally; history beyond what the finest interval covers (like a year of daily bars
+    next to 60 days of hourly ones) is fetched at its own interval and stitched in front.
+
+    :param periods: List of (days, interval), like [(365, '1d'), (60, '1h')].
+    :return: Dict of interval -> dict of ticker -> DataFrame.
+    """
+    today = datetime.now() + timedelta(days=1)
+    end_date = today.strftime("%Y-%m-%d")
+
+    # The finest interval covers the longest intraday period, within what the provider keeps
+    base_interval = timeframes.finest_interval([interval for _, interval in periods])
+    intraday_days = [days for days, interval in periods if timeframes.is_intraday(interval)]
+    base_days = max(intraday_days or [max(days for days, _ in periods)])
+    base_days = min(base_days, timeframes.INTRADAY_RETENTION_DAYS.get(base_interval, base_days))
+    base_start = (datetime.now() - timedelta(days=base_days)).strftime("%Y-%m-%d")
 
-# Load backtest portfolio data from Excel
-portfolio_backtest_group_data = pd.read_excel('backtest_group.xlsx')
+    base_frames = fetch_many_stock_data(tickers, base_start, end_date, base_interval, progress, max_workers)
 
-# Load whole portfolio data from Excel
-portfolio_data = pd.read_excel('portfolio.xlsx')
+    frames = {}
+    for days, interval in periods:
+        start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+        if interval == base_interval:
+            derived = {ticker: base_frames[ticker] for ticker in tickers}
+        else:
+            derived = {ticker: timeframes.resample_bars(base_frames[ticker], interval) for ticker in tickers}
+
+        if start_date < base_start:
+            older = fetch_many_stock_data(tickers, start_date, base_start, interval, progress, max_workers)
+            derived = {ticker: timeframes.stitch_bars(older[ticker], derived[ticker]) for ticker in tickers}
 
-def fetch_stock_data(ticker, start_date, end_date, interval, progress=False):
-    stock_data = yf.download(ticker, start=start_date, end=end_date, interval=interval, progress=progress)
-    return stock_data
+        # Callers add indicator columns to the frames, so hand out copies
+        frames[interval] = {ticker: derived[ticker].loc[start_date:].copy() for ticker in tickers}
+    return frames
+
+@profiling.profiled('analyze_stock')
+def analyze_stock(data, weights, context=None, lean=False):
+    """
+    :param context: tech_analysis_tools.IndicatorContext of data, to share (and report) indicator
+                    results with the caller. A new one is used when not given.
+    :param lean: Leave data untouched: the indicator values stay in the context instead of being
+                 added to data as columns, so data can be a slice of a larger frame.
+    """
+    if context is None:
+        context = tech_analysis_tools.IndicatorContext(data)
 
-def analyze_stock(data, weights):
     # Calculate RSI
-    data.loc[:, 'RSI'] = tech_analysis_tools.calculate_rsi(data)
+    rsi = context.get('rsi')
 
     # Calculate MACD
-    macd_histogram, macd_line, signal_line = tech_analysis_tools.calculate_macd(data)
+    macd_histogram, macd_line, signal_line = context.get('macd')
 
     # Calculate VWAP
-    data.loc[:, 'VWAP'] = tech_analysis_tools.calculate_vwap(data)
+    vwap_line = context.get('vwap')
 
     # Calculate Parabolic SAR
-    data = tech_analysis_tools.calculate_parabolic_sar(data)
+    parabolic_sar = context.get('parabolic_sar')
 
     # Analyze Parabolic SAR
-    parabolic_sar_status = tech_analysis_tools.analyze_parabolic_sar(data)
+    with profiling.stage('signal parabolic_sar'):
+        parabolic_sar_status = tech_analysis_tools.parabolic_sar_signal(data, parabolic_sar)
 
     # Check for Golden Cross
-    golden_cross = tech_analysis_tools.check_golden_cross(data)
+    sma_50, sma_200 = context.get('sma', window=50), context.get('sma', window=200)
+    with profiling.stage('signal golden_cross'):
+        golden_cross = tech_analysis_tools.check_golden_cross(data, sma_50, sma_200)
 
     # Analyze Volume Trend
-    volume_trend = tech_analysis_tools.analyze_volume_trend(data)
+    vma = context.get('vma')
+    with profiling.stage('signal volume_trend'):
+        volume_trend = tech_analysis_tools.volume_trend_signal(data, vma=vma, add_columns=not lean)
 
     # Calculate Bollinger Bands
-    data.loc[:, 'Bollinger_Upper'], data.loc[:, 'Bollinger_Lower'] = tech_analysis_tools.calculate_bollinger_bands(data)
+    bollinger_upper_band, bollinger_lower_band = context.get('bollinger_bands')
 
     # Calculate Stochastic Oscillator
-    data.loc[:, 'Stochastic_%K'], data.loc[:, 'Stochastic_%D'] = tech_analysis_tools.calculate_stochastic_oscillator(data)
+    stochastic_k_line, stochastic_d_line = context.get('stochastic_oscillator')
+
+    if not lean:
+        data.loc[:, 'RSI'] = rsi
+        data.loc[:, 'VWAP'] = vwap_line
+        data.loc[:, 'Parabolic_SAR'] = parabolic_sar
+        data.loc[:, 'Bollinger_Upper'], data.loc[:, 'Bollinger_Lower'] = bollinger_upper_band, bollinger_lower_band
+        data.loc[:, 'Stochastic_%K'], data.loc[:, 'Stochastic_%D'] = stochastic_k_line, stochastic_d_line
 
     # # Get the latest values
-    latest_rsi = data['RSI'].iloc[-1]
+    latest_rsi = rsi.iloc[-1]
     latest_macd_histogram = macd_histogram.iloc[-1]
 
     # Determine RSI status
     if latest_rsi > 70:
-        rsi_status = 'Overbought (Sell Signal)'
+        rsi_status = tech_analysis_tools.OVERBOUGHT
     elif latest_rsi < 30:
-        rsi_status = 'Oversold (Buy Signal)'
+        rsi_status = tech_analysis_tools.OVERSOLD
     else:
-        rsi_status = 'Neutral'
+        rsi_status = tech_analysis_tools.NEUTRAL_ZONE
 
 
     # Determine MACD status
     if macd_line.iloc[-1] > signal_line.iloc[-1]:
-        macd_status = 'Bullish (Buy Signal)'
+        macd_status = tech_analysis_tools.MACD_BULLISH
     else:
-        macd_status = 'Bearish (Sell Signal)'
+        macd_status = tech_analysis_tools.MACD_BEARISH
 
     # Determine MACD Histogram reversal
-    macd_histogram_status = 'No Reversal'
+    macd_histogram_status = tech_analysis_tools.NO_REVERSAL
     if len(macd_histogram) > 1:
         previous_macd_histogram = macd_histogram.iloc[-2]
         if previous_macd_histogram < 0 and latest_macd_histogram >= 0:
-            macd_histogram_status = 'Reversal to Bullish (Buy Signal)'
+            macd_histogram_status = tech_analysis_tools.MACD_REVERSAL_BULLISH
         elif previous_macd_histogram > 0 and latest_macd_histogram <= 0:
-            macd_histogram_status = 'Reversal to Bearish (Sell Signal)'
+            macd_histogram_status = tech_analysis_tools.MACD_REVERSAL_BEARISH
 
     # Determine if current price is above or below VWAP
     current_price = data['Close'].iloc[-1]
-    vwap = data['VWAP'].iloc[-1]
+    vwap = vwap_line.iloc[-1]
     
     if current_price < vwap:
-        vwap_status = "Current Price is Under VWAP (Buy Signal)"
+        vwap_status = tech_analysis_tools.UNDER_VWAP
     else:
-        vwap_status = "Current Price is Over VWAP (Sell Signal)"
+        vwap_status = tech_analysis_tools.OVER_VWAP
 
     # Golden Cross status
     if golden_cross:
-        golden_cross_status = 'Golden Cross (Strong Buy Signal)'
+        golden_cross_status = tech_analysis_tools.GOLDEN_CROSS
     else:
-        golden_cross_status = 'No Golden Cross'
+        golden_cross_status = tech_analysis_tools.NO_GOLDEN_CROSS
 
     # Analyze Bollinger Bands status
-    bollinger_upper = data['Bollinger_Upper'].iloc[-1]
-    bollinger_lower = data['Bollinger_Lower'].iloc[-1]
+    bollinger_upper = bollinger_upper_band.iloc[-1]
+    bollinger_lower = bollinger_lower_band.iloc[-1]
     if current_price >= bollinger_upper:
-        bollinger_status = 'Price near Upper Bollinger Band (Sell Signal)'
+        bollinger_status = tech_analysis_tools.NEAR_UPPER_BAND
     elif current_price <= bollinger_lower:
-        bollinger_status = 'Price near Lower Bollinger Band (Buy Signal)'
+        bollinger_status = tech_analysis_tools.NEAR_LOWER_BAND
     else:
-        bollinger_status = 'Price within Bollinger Bands (Neutral)'
+        bollinger_status = tech_analysis_tools.WITHIN_BANDS
 
     # Analyze Stochastic Oscillator status
-    stochastic_k = data['Stochastic_%K'].iloc[-1]
-    stochastic_d = data['Stochastic_%D'].iloc[-1]
+    stochastic_k = stochastic_k_line.iloc[-1]
+    stochastic_d = stochastic_d_line.iloc[-1]
     if stochastic_k > 80 and stochastic_d > 80:
-        stochastic_status = 'Overbought (Sell Signal)'
+        stochastic_status = tech_analysis_tools.OVERBOUGHT
     elif stochastic_k < 20 and stochastic_d < 20:
-        stochastic_status = 'Oversold (Buy Signal)'
+        stochastic_status = tech_analysis_tools.OVERSOLD
     else:
-        stochastic_status = 'Neutral'
+        stochastic_status = tech_analysis_tools.NEUTRAL_ZONE
 
     # Analyze Volume Trend
-    candlestick_pattern = tech_analysis_tools.analyze_candlestick_patterns(data)
+    with profiling.stage('signal candlestick'):
+        candlestick_pattern = tech_analysis_tools.latest_candlestick_pattern(data)
 
-    adx_analysis = tech_analysis_tools.analyze_adx(data)
+    adx = context.get('adx')
 
-    # Example decision-making process using ADX
-    if adx_analysis.startswith("Strong Trend"):
+    # Example decision-making process using ADX, a strong trend from 25 like analyze_adx
+    if adx.iloc[-1] >= 25:
         #adx_decision = "Consider following MACD signal"
         adx_status = macd_status
     else:
@@ -132,19 +238,21 @@ def analyze_stock(data, weights):
         adx_status = rsi_status
 
 
-    divergance_status = tech_analysis_tools.detect_rsi_divergence(data)
+    # Swing highs and lows shared by the three pattern detectors
+    swings = context.get('swing_points')
 
-    head_and_shoulder_detect = tech_analysis_tools.detect_head_and_shoulders(data)
+    with profiling.stage('signal rsi_divergence'):
+        divergance_status = tech_analysis_tools.rsi_divergence_signal(data, swings, rsi)
 
-    detect_double_top_bottom = tech_analysis_tools.detect_double_top_bottom(data)
+    with profiling.stage('signal head_and_shoulders'):
+        head_and_shoulder_detect = tech_analysis_tools.head_and_shoulders_signal(data, swings, add_columns=not lean)
 
-    fibonacci_signal = tech_analysis_tools.analyze_fibonacci_signal(data)
-    
-    # Calculate weighted scores for buy and sell signals
-    weighted_buy_score = 0
-    weighted_sell_score = 0
-    weighted_hold_score = 0
+    with profiling.stage('signal double_top_bottom'):
+        detect_double_top_bottom = tech_analysis_tools.double_top_bottom_signal(data, swings=swings)
 
+    with profiling.stage('signal fibonacci'):
+        fibonacci_signal = tech_analysis_tools.fibonacci_signal(data)
+    
     price_drop = tech_analysis_tools.analyze_price_drop(data, drop_threshold=0.20)
 
     indicators = {
@@ -165,23 +273,7 @@ def analyze_stock(data, weights):
         'fibonacci_signal':fibonacci_signal
     }
 
-    for indicator, status in indicators.items():
-        if 'Buy Signal' in status:
-            weighted_buy_score += weights[indicator]
-        elif 'Sell Signal' in status:
-            weighted_sell_score += weights[indicator]
-        else:
-            weighted_hold_score += weights[indicator]
-
-    weigth_scores = (f"B:{weighted_buy_score:.1f} /S:{weighted_sell_score:.1f} /H:{weighted_hold_score:.1f}")
-
-    if weighted_buy_score > weighted_sell_score and weighted_buy_score > weighted_hold_score:
-        decision = "Consider Buy"
-    elif weighted_sell_score > weighted_buy_score and weighted_sell_score > weighted_hold_score:
-        decision = "Consider Sell"
-    else:
-        decision = "Hold"
-
+    weigth_scores, decision = weighted_decision(indicators, weights)
 
     return {
         'RSI': latest_rsi,
@@ -208,15 +300,285 @@ def analyze_stock(data, weights):
     }
 
 
+def analyze_stock_cached(ticker, interval, data, weights, context=None):
+    """
+    analyze_stock, reusing the previous analysis when data and weights did not change since
+    (see result_cache). Most symbols have no new bar between two cycles of the real-time loop.
+    """
+    # The key is taken before analyze_stock adds its columns to data
+    cache_key = result_cache.key(ticker, interval, data, weights)
+    analysis = result_cache.get(cache_key)
+    if analysis is None:
+        analysis = analyze_stock(data, weights, context)
+        result_cache.put(cache_key, analysis)
+    return analysis
+
+
+def weighted_decision(indicators, weights):
+    """
+    Weighted buy/sell/hold scores of the indicator status codes and the decision they lead to.
+
+    :return: (scores text, decision)
+    """
+    directions = tech_analysis_tools.SIGNAL_DIRECTIONS[[indicators[indicator] for indicator in INDICATORS]]
+    weighted_buy_score, weighted_sell_score, weighted_hold_score = (score[0] for score in weighted_scores(directions[np.newaxis], weights))
+
+    weigth_scores = (f"B:{weighted_buy_score:.1f} /S:{weighted_sell_score:.1f} /H:{weighted_hold_score:.1f}")
+    decision = DECISIONS[decision_codes(weighted_buy_score, weighted_sell_score, weighted_hold_score)]
+
+    return weigth_scores, decision
+
+
+# Indicators scored by analyze_stock, in the order their weights are added up
+INDICATORS = [
+    'RSI_Status',
+    'MACD_Status',
+    'ADX_Status',
+    'MACD_Histogram_Status',
+    'VWAP_Status',
+    'Golden_Cross_Status',
+    'Parabolic_SAR_Status',
+    'Volume_Trend',
+    'Bollinger_Status',
+    'Stochastic_Status',
+    'CandleStick_Pattern_Status',
+    'Divergance_status',
+    'Head_and_Shoulder_detect',
+    'Double_Top_Bottom',
+    'fibonacci_signal'
+]
+
+def indicator_history(data, context=None):
+    """
+    Per-bar status code of every indicator in INDICATORS, plus the RSI, VWAP, Current_Price and
+    Candlestick_Pattern values. Does not depend on the weights. The input data is not modified.
+
+    :param context: tech_analysis_tools.IndicatorContext of data, a new one is used when not given.
+    """
+    if context is None:
+        context = tech_analysis_tools.IndicatorContext(data)
+    close = data['Close']
+
+    rsi = context.get('rsi')
+    macd_histogram, macd_line, signal_line = context.get('macd')
+    vwap = context.get('vwap')
+    parabolic_sar = pd.Series(context.get('parabolic_sar'), index=data.index)
+    sma_50 = context.get('sma', window=50)
+    sma_200 = context.get('sma', window=200)
+    vma = context.get('vma')
+    bollinger_upper, bollinger_lower = context.get('bollinger_bands')
+    stochastic_k, stochastic_d = context.get('stochastic_oscillator')
+    adx = context.get('adx')
+    swings = context.get('swing_points')
+
+    # Status codes are written straight into one int8 matrix, a column per indicator
+    codes = np.empty((len(data), len(INDICATORS)), dtype=np.int8)
+    status = dict(zip(INDICATORS, codes.T))
+
+    status['RSI_Status'][:] = np.select([rsi > 70, rsi < 30], [tech_analysis_tools.OVERBOUGHT, tech_analysis_tools.OVERSOLD], tech_analysis_tools.NEUTRAL_ZONE)
+    status['MACD_Status'][:] = np.where(macd_line > signal_line, tech_analysis_tools.MACD_BULLISH, tech_analysis_tools.MACD_BEARISH)
+
+    previous_macd_histogram = macd_histogram.shift(1)
+    status['MACD_Histogram_Status'][:] = np.select(
+        [(previous_macd_histogram < 0) & (macd_histogram >= 0), (previous_macd_histogram > 0) & (macd_histogram <= 0)],
+        [tech_analysis_tools.MACD_REVERSAL_BULLISH, tech_analysis_tools.MACD_REVERSAL_BEARISH],
+        tech_analysis_tools.NO_REVERSAL
+    )
+
+    status['VWAP_Status'][:] = np.where(close < vwap, tech_analysis_tools.UNDER_VWAP, tech_analysis_tools.OVER_VWAP)
+
+    golden_cross = (sma_50 > sma_200) & (sma_50.shift(1) <= sma_200.shift(1))
+    status['Golden_Cross_Status'][:] = np.where(golden_cross, tech_analysis_tools.GOLDEN_CROSS, tech_analysis_tools.NO_GOLDEN_CROSS)
+
+    status['Parabolic_SAR_Status'][:] = np.select(
+        [(close > parabolic_sar) & (parabolic_sar.shift(1) >= close.shift(1)),
+         (close < parabolic_sar) & (parabolic_sar.shift(1) <= close.shift(1))],
+        [tech_analysis_tools.SAR_REVERSAL_UP, tech_analysis_tools.SAR_REVERSAL_DOWN],
+        tech_analysis_tools.SAR_NO_REVERSAL
+    )
+
+    status['Volume_Trend'][:] = np.where(data['Volume'] > vma, tech_analysis_tools.VOLUME_INCREASING, tech_analysis_tools.VOLUME_DECREASING)
+
+    status['Bollinger_Status'][:] = np.select(
+        [close >= bollinger_upper, close <= bollinger_lower],
+        [tech_analysis_tools.NEAR_UPPER_BAND, tech_analysis_tools.NEAR_LOWER_BAND],
+        tech_analysis_tools.WITHIN_BANDS
+    )
+
+    status['Stochastic_Status'][:] = np.select(
+        [(stochastic_k > 80) & (stochastic_d > 80), (stochastic_k < 20) & (stochastic_d < 20)],
+        [tech_analysis_tools.OVERBOUGHT, tech_analysis_tools.OVERSOLD],
+        tech_analysis_tools.NEUTRAL_ZONE
+    )
+
+    # Pattern found on each bar; the status carries the most recent one forward
+    candlestick_codes = context.get('candlestick_codes')
+    status['CandleStick_Pattern_Status'][:] = tech_analysis_tools.candlestick_pattern_history(data, candlestick_codes)
+
+    # Strong trend follows the MACD signal, otherwise the RSI signal
+    status['ADX_Status'][:] = np.where(adx >= 25, status['MACD_Status'], status['RSI_Status'])
+
+    status['Divergance_status'][:] = tech_analysis_tools.rsi_divergence_history(data, rsi, swings)
+    status['Head_and_Shoulder_detect'][:] = tech_analysis_tools.head_and_shoulders_history(data, swings)
+    status['Double_Top_Bottom'][:] = tech_analysis_tools.double_top_bottom_history(data, swings=swings)
+    status['fibonacci_signal'][:] = tech_analysis_tools.fibonacci_signal_history(data)
+
+    history = pd.DataFrame(codes, index=data.index, columns=INDICATORS, copy=False)
+
+    history['RSI'] = rsi
+    history['VWAP'] = vwap
+    history['Current_Price'] = close
+    history['Candlestick_Pattern'] = candlestick_codes
+
+    return history
+
+def direction_matrix(history):
+    """
+    Direction of every indicator status in history: 1 buy, -1 sell, 0 neither.
+
+    :return: int8 array of shape (bars, len(INDICATORS)).
+    """
+    # Filled one column at a time, so no (bars, indicators) array of intp indices is ever built
+    directions = np.empty((len(history), len(INDICATORS)), dtype=np.int8)
+    for column, indicator in enumerate(INDICATORS):
+        directions[:, column] = tech_analysis_tools.SIGNAL_DIRECTIONS[history[indicator].to_numpy()]
+    return directions
+
+def weight_vector(weights):
+    # Weights dict -> array in INDICATORS order
+    return np.array([weights[indicator] for indicator in INDICATORS], dtype=float)
+
+def weighted_scores(directions, weights):
+    """
+    Weighted buy, sell and hold scores for every bar.
+
+    This is the product of the direction masks with the weights, but it is added up one indicator
+    at a time in INDICATORS order, exactly like analyze_stock, so ties between scores resolve the same way.
+
+    :param directions: Array from direction_matrix, shape (bars, indicators).
+    :param weights: Weights dict, a weight vector, or an array of shape (candidates, indicators)
+                    to score many weight sets at once.
+    :return: Buy, sell and hold scores, shape (bars,) or (bars, candidates).
+    """
+    if isinstance(weights, dict):
+        weights = weight_vector(weights)
+    weights = np.asarray(weights, dtype=float)
+
+    shape = (len(directions),) + weights.shape[:-1]
+    weighted_buy_score = np.zeros(shape)
+    weighted_sell_score = np.zeros(shape)
+    weighted_hold_score = np.zeros(shape)
+    for column in range(len(INDICATORS)):
+        direction = directions[:, column].reshape((-1,) + (1,) * (weights.ndim - 1))
+        weight = weights[..., column]
+        weighted_buy_score += np.where(direction == 1, weight, 0.0)
+        weighted_sell_score += np.where(direction == -1, weight, 0.0)
+        weighted_hold_score += np.where(direction == 0, weight, 0.0)
+
+    return weighted_buy_score, weighted_sell_score, weighted_hold_score
+
+# Decision text of each decision code (index -1 is Consider Sell)
+DECISIONS = np.array(["Hold", "Consider Buy", "Consider Sell"], dtype=object)
+
+def decision_codes(weighted_buy_score, weighted_sell_score, weighted_hold_score):
+    # 1 Consider Buy, -1 Consider Sell, 0 Hold
+    return np.select(
+        [(weighted_buy_score > weighted_sell_score) & (weighted_buy_score > weighted_hold_score),
+         (weighted_sell_score > weighted_buy_score) & (weighted_sell_score > weighted_hold_score)],
+        [1, -1],
+        0
+    ).astype(np.int8)
+
+def analyze_stock_history(data, weights, dtype=None):
+    """
+    Per-bar companion of analyze_stock, computed with whole-column operations.
+
+    Row i holds the indicator statuses, weighted scores and decision that analyze_stock
+    returns for data.iloc[:i+1]. The first bar has no decision. The input data is not modified.
+
+    :param dtype: Float type the indicator values are kept as (see IndicatorContext), np.float32 for long histories.
+    """
+    history = indicator_history(data, tech_analysis_tools.IndicatorContext(data, dtype))
+
+    weighted_buy_score, weighted_sell_score, weighted_hold_score = weighted_scores(direction_matrix(history), weights)
+    decisions = decision_codes(weighted_buy_score, weighted_sell_score, weighted_hold_score)
+
+    decision = DECISIONS[decisions]
+    decision[:1] = None  # analyze_stock needs at least two bars
+
+    history['Buy_Score'] = weighted_buy_score
+    history['Sell_Score'] = weighted_sell_score
+    history['Hold_Score'] = weighted_hold_score
+    history['Decision'] = decision
+
+    return history
+
+
 def print_with_color(text, color):
     """
     Print text with specified color using coloramapython m  
     """
+    from colorama import Fore, Style
+
     color_code = getattr(Fore, color.upper(), Fore.WHITE)
     reset_code = Style.RESET_ALL
     print(f"{color_code}{text}{reset_code}")
 
-def real_time_analysis(qdays, interval, weights):
+def print_analysis(symbol, analysis, status, purchase_date, purchase_price, purchase_qty):
+    # Indicator statuses are codes, rendered to their messages only here
+    message = tech_analysis_tools.signal_message
+
+    print(f"\nAnalyzing {symbol}  ${analysis['Current_Price']:.2f}")
+    print(f"Weight Scores {analysis['weigth_scores']}")
+    
+
+    if analysis:
+        if analysis['Decision'] != "Hold":
+            print(f"Price Action: {analysis['Price_Drop']}")
+            print(f"RSI: {message(analysis['RSI_Status'])}")
+            print(f"Stochastic: {message(analysis['Stochastic_Status'])}")
+            print(f"ADX Status: {message(analysis['ADX_Status'])}")
+            print(f"MACD Status: {message(analysis['MACD_Status'])}")
+            print(f"MACD Histogram: {message(analysis['MACD_Histogram_Status'])}")
+            print(f"Divergance Detection: {message(analysis['Divergance_status'])}")
+            print(f"Parabolic_SAR: {message(analysis['Parabolic_SAR_Status'])}")
+            print(f"Bollinger: {message(analysis['Bollinger_Status'])}")
+            print(f"VWAP: {analysis['VWAP']:.2f} ({message(analysis['VWAP_Status'])})")
+            print(f"Volume Trend: {message(analysis['Volume_Trend'])}")
+            print(f"Golden Cross: {message(analysis['Golden_Cross_Status'])}")
+            print(f"CandleStick Pattern: {message(analysis['CandleStick_Pattern_Status'])}")
+            print(f"Head and Shoulder Pattern: {message(analysis['Head_and_Shoulder_detect'])}")
+            print(f"Double Top/Bottom Pattern: {message(analysis['Double_Top_Bottom'])}")
+            print(f"Fibonacci Signal: {message(analysis['fibonacci_signal'])}")
+            
+            if analysis['Decision'] == "Consider Sell" and status == "HOLDING":
+                print_with_color(f"Decision: {analysis['Decision']}", "red")
+
+                if purchase_date and purchase_price and purchase_qty:
+                    holding_type, gain_or_loss, tax_implication, gain_or_loss_perc = tech_analysis_tools.calculate_tax_implications(
+                        purchase_date, purchase_price, analysis['Current_Price'], purchase_qty
+                    )
+                    print("***********")
+                    print(f"Holding Type: {holding_type}")
+                    print(f"Potential Gain/Loss: ${gain_or_loss:.2f} ({gain_or_loss_perc:.0f}%)")
+                    print(f"Estimated Tax Implication: ${tax_implication:.2f}")
+                    print("***********")
+            elif analysis['Decision'] == "Consider Sell" and status != "HOLDING":
+                print_with_color(f"Decision: ****Possible Opportunity Coming****", "yellow")
+                
+            if analysis['Decision'] == "Consider Buy":
+                print_with_color(f"Decision: {analysis['Decision']}", "green")
+        else:
+            print_with_color(f"Decision: {analysis['Decision']}", "cyan")
+    else:
+        print(f"Could not analyze {symbol}")
+
+def real_time_analysis(qdays, interval, weights, max_workers=MAX_WORKERS, indicator_report=False, stock_data=None, use_result_cache=False):
+    """
+    :param stock_data: Dict of symbol -> bars already fetched for this interval (see fetch_timeframes),
+                       the portfolio is fetched when not given.
+    :param use_result_cache: Reuse the analysis of symbols whose bars did not change (see analyze_stock_cached).
+    """
     # Step 1: Define the date range
     date_back = datetime.now() - timedelta(days=qdays)
     today = datetime.now() + timedelta(days=1)
@@ -227,66 +589,72 @@ def real_time_analysis(qdays, interval, weights):
     print(f"\nDate range: {start_date} to {end_date} and {interval} chart\n")
     print("********************************************************************")
 
-    # Loop through each row in the portfolio data
-    for index, row in portfolio_data.iterrows():
-        symbol = row['Symbol']
-        status = row['STATUS']
-        purchase_date = row['PURCHASE _DATE']
-        purchase_price = row['PURCHASE_PRICE']
-        purchase_qty = row['PURCHASE_QTY']
+    portfolio_data = load_portfolio()
+    symbols = portfolio_data['Symbol'].tolist()
 
-        # Analyze stock
-        stock_data = fetch_stock_data(symbol, start_date, end_date, interval, progress=False)
-        analysis = analyze_stock(stock_data, weights)
-
-        print(f"\nAnalyzing {symbol}  ${analysis['Current_Price']:.2f}")
-        print(f"Weight Scores {analysis['weigth_scores']}")
-        
-
-        if analysis:
-            if analysis['Decision'] != "Hold":
-                print(f"Price Action: {analysis['Price_Drop']}")
-                print(f"RSI: {analysis['RSI_Status']}")
-                print(f"Stochastic: {analysis['Stochastic_Status']}")
-                print(f"ADX Status: {analysis['ADX_Status']}")
-                print(f"MACD Status: {analysis['MACD_Status']}")
-                print(f"MACD Histogram: {analysis['MACD_Histogram_Status']}")
-                print(f"Divergance Detection: {analysis['Divergance_status']}")
-                print(f"Parabolic_SAR: {analysis['Parabolic_SAR_Status']}")
-                print(f"Bollinger: {analysis['Bollinger_Status']}")
-                print(f"VWAP: {analysis['VWAP']:.2f} ({analysis['VWAP_Status']})")
-                print(f"Volume Trend: {analysis['Volume_Trend']}")
-                print(f"Golden Cross: {analysis['Golden_Cross_Status']}")
-                print(f"CandleStick Pattern: {analysis['CandleStick_Pattern_Status']}")
-                print(f"Head and Shoulder Pattern: {analysis['Head_and_Shoulder_detect']}")
-                print(f"Double Top/Bottom Pattern: {analysis['Double_Top_Bottom']}")
-                print(f"Fibonacci Signal: {analysis['fibonacci_signal']}")
-                
-                if analysis['Decision'] == "Consider Sell" and status == "HOLDING":
-                    print_with_color(f"Decision: {analysis['Decision']}", "red")
-
-                    if purchase_date and purchase_price and purchase_qty:
-                        holding_type, gain_or_loss, tax_implication, gain_or_loss_perc = tech_analysis_tools.calculate_tax_implications(
-                            purchase_date, purchase_price, analysis['Current_Price'], purchase_qty
-                        )
-                        print("***********")
-                        print(f"Holding Type: {holding_type}")
-                        print(f"Potential Gain/Loss: ${gain_or_loss:.2f} ({gain_or_loss_perc:.0f}%)")
-                        print(f"Estimated Tax Implication: ${tax_implication:.2f}")
-                        print("***********")
-                elif analysis['Decision'] == "Consider Sell" and status != "HOLDING":
-                    print_with_color(f"Decision: ****Possible Opportunity Coming****", "yellow")
-                    
-                if analysis['Decision'] == "Consider Buy":
-                    print_with_color(f"Decision: {analysis['Decision']}", "green")
-            else:
-                print_with_color(f"Decision: {analysis['Decision']}", "cyan")
+    # Fetch every symbol at once (missing bars come from one batched download)
+    if stock_data is None:
+        try:
+            stock_data = fetch_many_stock_data(symbols, start_date, end_date, interval, progress=False, max_workers=max_workers)
+        except Exception as e:
+            print(f"Could not fetch portfolio data: {e}")
+            return
+
+    # One indicator context per symbol, so the reuse inside every analysis can be reported
+    contexts = {symbol: tech_analysis_tools.IndicatorContext(stock_data[symbol]) for symbol in symbols}
+
+    # Analyze the symbols in parallel, a failure only affects its own symbol
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if use_result_cache:
+            futures = [executor.submit(analyze_stock_cached, symbol, interval, stock_data[symbol], weights, contexts[symbol]) for symbol in symbols]
         else:
-            print(f"Could not analyze {symbol}")
+            futures = [executor.submit(analyze_stock, stock_data[symbol], weights, contexts[symbol]) for symbol in symbols]
+
+        # Print in portfolio order
+        for (index, row), future in zip(portfolio_data.iterrows(), futures):
+            symbol = row['Symbol']
+            try:
+                analysis = future.result()
+            except Exception as e:
+                print(f"\nCould not analyze {symbol}: {e}")
+                continue
+
+            print_analysis(symbol, analysis, row['STATUS'], row['PURCHASE _DATE'], row['PURCHASE_PRICE'], row['PURCHASE_QTY'])
+
+    if indicator_report:
+        print_indicator_report(contexts.values())
 
     print("\n")
 
-def backtest_analysis(qdays, interval, weights):
+def print_indicator_report(contexts):
+    # Times each indicator was computed and reused, added up over the analyzed symbols
+    computed = {}
+    hits = {}
+    for context in contexts:
+        for indicator, indicator_hits in context.report().items():
+            computed[indicator] = computed.get(indicator, 0) + 1
+            hits[indicator] = hits.get(indicator, 0) + indicator_hits
+
+    print("\nIndicator cache:")
+    for indicator in computed:
+        print(f"  {indicator:<58} computed {computed[indicator]:>4}  reused {hits[indicator]:>4}")
+    print(f"  Total: computed {sum(computed.values())}, reused {sum(hits.values())}")
+
+def _init_backtest_worker(provider_configuration, profile):
+    # Same market data provider and profiling state as the parent process
+    market_data.init_worker(*provider_configuration)
+    profiling.enable(profile)
+
+
+def _backtest_worker(*args, **kwargs):
+    # back_test.backtest in a worker process, with the stage timings of the call
+    import back_test
+    return profiling.run_profiled(back_test.backtest, *args, **kwargs)
+
+
+def backtest_analysis(qdays, interval, weights, workers=1, dtype=None):
+    import back_test
+
     # Step 1: Define the date range
     date_back = datetime.now() - timedelta(days=qdays)
     today = datetime.now() + timedelta(days=1)
@@ -302,11 +670,35 @@ def backtest_analysis(qdays, interval, weights):
     print(f"\nDate range: {start_date} to {end_date} and {interval} chart")
     print("***********")
 
-    # Loop through each row in the portfolio data
-    for index, row in portfolio_backtest_group_data.iterrows():
-        symbol = row['Symbol']
+    portfolio_backtest_group_data = load_backtest_group()
+    symbols = portfolio_backtest_group_data['Symbol'].tolist()
+
+    # Backtests are CPU bound, so spread the symbols over processes. workers=1 runs them
+    # one after the other in this process, which is easier to debug.
+    if workers > 1:
+        # The workers download their symbol themselves, with the same provider as this process,
+        # and send their stage timings back to be added to this process's profile
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_backtest_worker,
+                                 initargs=(market_data.configuration, profiling.enabled)) as executor:
+            # map returns the results in symbol order, so the totals below add up in the same order
+            results = []
+            for result, worker_timings in executor.map(
+                partial(_backtest_worker, dtype=dtype), symbols, repeat(start_date), repeat(end_date), repeat(interval), repeat(weights),
+                repeat(BACKTEST_PROFIT_THRESHOLD), repeat(BACKTEST_STOP_LOSS_THRESHOLD)
+            ):
+                profiling.merge(worker_timings)
+                results.append(result)
+    else:
+        results = [
+            back_test.backtest(symbol, start_date, end_date, interval, weights, profit_threshold=BACKTEST_PROFIT_THRESHOLD,
+                               stop_loss_threshold=BACKTEST_STOP_LOSS_THRESHOLD, dtype=dtype)
+            for symbol in symbols
+        ]
 
-        analysis = back_test.backtest(symbol, start_date, end_date, interval, weights, profit_threshold=0.04, stop_loss_threshold=0.02)
+    # Loop through each symbol's result in backtest group order
+    for symbol, analysis in zip(symbols, results):
+        if analysis is None:
+            continue
 
         print(f"\nAnalyzing {symbol} ${analysis['Current_Price']:.2f}")
 
@@ -343,12 +735,96 @@ def backtest_analysis(qdays, interval, weights):
     print("\n")
 
 
-def optimized_analysis():
+def verify_backtest_engines(qdays, interval, weights, lean=False, dtype=None):
+    import back_test
+
+    # Step 1: Define the date range
+    date_back = datetime.now() - timedelta(days=qdays)
+    today = datetime.now() + timedelta(days=1)
+    start_date = date_back.strftime("%Y-%m-%d")
+    end_date = today.strftime("%Y-%m-%d")
+
+    print(f"\nComparing backtest engines from {start_date} to {end_date} on {interval} chart")
+    print("***********")
+
+    for index, row in load_backtest_group().iterrows():
+        symbol = row['Symbol']
+        stock_data = fetch_stock_data(symbol, start_date, end_date, interval, progress=False)
+        if stock_data.empty:
+            print(f"No data found for {symbol}")
+            continue
+
+        start = time.perf_counter()
+        back_test.run_backtest(stock_data, weights, profit_threshold=BACKTEST_PROFIT_THRESHOLD, stop_loss_threshold=BACKTEST_STOP_LOSS_THRESHOLD, engine='prefix', lean=lean)
+        prefix_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        back_test.run_backtest(stock_data, weights, profit_threshold=BACKTEST_PROFIT_THRESHOLD, stop_loss_threshold=BACKTEST_STOP_LOSS_THRESHOLD, engine='single_pass', dtype=dtype)
+        single_pass_time = time.perf_counter() - start
+
+        differences = back_test.compare_engines(stock_data, weights, profit_threshold=BACKTEST_PROFIT_THRESHOLD,
+                                                stop_loss_threshold=BACKTEST_STOP_LOSS_THRESHOLD, lean=lean, dtype=dtype)
+        print(f"\n{symbol}: {len(stock_data)} bars, prefix {prefix_time:.2f}s, single pass {single_pass_time:.2f}s")
+        if differences:
+            print_with_color(f"{len(differences)} differences", "red")
+            for difference in differences:
+                print(difference)
+        else:
+            print_with_color("Identical decisions and trades", "green")
+
+    print("\n")
+
+
+def optimized_analysis(random_candidates=0, universe=False, batch_size=None, max_workers=None):
+    import back_test
+
+    if universe:
+        back_test.run_universe_optimization(batch_size=batch_size, workers=max_workers)
+    else:
+        back_test.run_optimization(random_candidates=random_candidates)
+
+
+def walk_forward_analysis(qdays, interval, weights, candidates=0, max_workers=None):
+    # Out-of-sample check of the weights against weights re-optimized on every train fold
+    import back_test
 
-    back_test.run_optimization()
+    print("********************************************************************")
+    print(f"\nWalk-forward over {qdays} days at {interval}\n")
+    print("********************************************************************")
+    back_test.run_walk_forward(weights, days=qdays, interval=interval, candidates=candidates or 2000, workers=max_workers,
+                               profit_threshold=BACKTEST_PROFIT_THRESHOLD, stop_loss_threshold=BACKTEST_STOP_LOSS_THRESHOLD)
 
 
-def main(backtest=False, opt=False):
+def exit_rule_analysis(qdays, interval, weights, max_workers=None):
+    # Win_perc of the weights with every profit / stop loss pair of the default grid
+    import back_test
+
+    print("********************************************************************")
+    print(f"\nExit rule sweep over {qdays} days at {interval}\n")
+    print("********************************************************************")
+    back_test.run_exit_rule_sweep(weights, days=qdays, interval=interval, workers=max_workers)
+
+
+def report_result_cache(path):
+    # Print the result cache counters, and save the cache to path when one was given
+    stats = result_cache.stats
+    print(f"Result cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions, "
+          f"{len(result_cache.entries)} analyses kept")
+    if path:
+        result_cache.save(path)
+
+
+def report_profile(profile):
+    # Print the stage timings, and write them to the --profile file when one was given
+    profiling.print_summary()
+    if profile:
+        profiling.write_summary(profile)
+        print(f"Profile written to {profile}")
+
+
+def main(backtest=False, opt=False, verify=False, max_workers=None, candidates=0, universe=False, batch_size=None, live=False, indicator_report=False,
+         profile=None, lean=False, dtype=None, walk_forward=False, exit_sweep=False, resample=False,
+         cache_results=None):
     # Description
     #RSI_Status - Detect overbought/oversold signals for potential reversals
     #MACD_Status - Momentum shifts, but reduce to minimize false signals
@@ -431,27 +907,112 @@ def main(backtest=False, opt=False):
     fifteen_Minute_period_length = 15  
     five_Minute_period_length = 5  
 
+    # cache_results is None without the result cache, '' to keep it in memory, or a file to also keep it between runs
+    if cache_results:
+        loaded = result_cache.load(cache_results)
+        print(f"Loaded {loaded} cached analyses from {cache_results}")
+
+    # profile is None when not profiling, '' to print the timings, or a JSON file to also write them to
+    if profile is not None:
+        profiling.enable()
+
+    # Worker processes are opt-in: without max_workers the backtests and optimizations run
+    # sequentially, while the real-time loops keep fetching and analyzing on MAX_WORKERS threads
+    process_workers = max_workers or 1
+    thread_workers = max_workers or MAX_WORKERS
+
     if backtest:
-        backtest_analysis(year_period_length, "1d", weights_day_chart)
-        backtest_analysis(hr_period_length, "1h", weights_hour_chart)
+        backtest_analysis(year_period_length, "1d", weights_day_chart, process_workers, dtype)
+        backtest_analysis(hr_period_length, "1h", weights_hour_chart, process_workers, dtype)
         #backtest_analysis(fifteen_Minute_period_length, "15m", weights_minute_chart)
         #backtest_analysis(five_Minute_period_length, "5m", weights_minute_chart)
+    elif verify:
+        verify_backtest_engines(year_period_length, "1d", weights_day_chart, lean, dtype)
+        verify_backtest_engines(hr_period_length, "1h", weights_hour_chart, lean, dtype)
+    elif exit_sweep:
+        exit_rule_analysis(year_period_length, "1d", weights_day_chart, process_workers)
+        exit_rule_analysis(hr_period_length, "1h", weights_hour_chart, process_workers)
+    elif walk_forward:
+        walk_forward_analysis(year_period_length, "1d", weights_day_chart, candidates, process_workers)
+        walk_forward_analysis(hr_period_length, "1h", weights_hour_chart, candidates, process_workers)
     elif opt:
         # Run the optimization
-        optimized_analysis()
+        optimized_analysis(candidates, universe, batch_size, process_workers)
+    elif live:
+        # Keeps every symbol's bars and indicator state between cycles and only processes new bars
+        import live_analysis
+        live_analysis.run_live([
+            (year_period_length, "1d", weights_day_chart),
+            (hr_period_length, "1h", weights_hour_chart),
+        ], thread_workers, after_cycle=(lambda: report_profile(profile)) if profile is not None else None)
     else:
         while True:
-            real_time_analysis(year_period_length, "1d", weights_day_chart)
-            real_time_analysis(hr_period_length, "1h", weights_hour_chart)
+            # With resample, one hourly download per cycle; the daily bars are built from it
+            frames = {}
+            if resample:
+                try:
+                    symbols = load_portfolio()['Symbol'].tolist()
+                    frames = fetch_timeframes(symbols, [(year_period_length, "1d"), (hr_period_length, "1h")], max_workers=thread_workers)
+                except Exception as e:
+                    print(f"Could not fetch portfolio data: {e}")
+
+            real_time_analysis(year_period_length, "1d", weights_day_chart, thread_workers, indicator_report, frames.get("1d"), cache_results is not None)
+            real_time_analysis(hr_period_length, "1h", weights_hour_chart, thread_workers, indicator_report, frames.get("1h"), cache_results is not None)
             #real_time_analysis(fifteen_Minute_period_length, "15m", weights_minute_chart) 
             #real_time_analysis(five_Minute_period_length, "5m", weights_minute_chart) 
+            if profile is not None:
+                report_profile(profile)
+            if cache_results is not None:
+                report_result_cache(cache_results)
             print("***********************************************************")
             print("10 minutes before running again...")
             time.sleep(600)  # Sleep in seconds
+
+    # The backtest, verify and optimization runs end
+    if profile is not None:
+        report_profile(profile)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Stock Analysis Tool')
     parser.add_argument('--backtest', action='store_true', help='Run backtesting and optimization')
     parser.add_argument('--opt', action='store_true', help='Optimize weights')
+    parser.add_argument('--verify', action='store_true', help='Check the single pass backtest engine against the prefix engine')
+    parser.add_argument('--workers', type=int, help='Processes for --backtest, --walk-forward, --exit-sweep and --opt --universe (default: 1, sequential); '
+                                                    f'threads fetching and analyzing symbols in the real-time loops (default: {MAX_WORKERS})')
+    parser.add_argument('--walk-forward', action='store_true', help='Score the weights on rolling train/test folds of the backtest group, '
+                                                                     'against weights optimized on every train fold')
+    parser.add_argument('--exit-sweep', action='store_true', help='Backtest the weights with a grid of profit and stop loss thresholds (1%% to 10%%) '
+                                                                   'and print the average Win_perc of every pair')
+    parser.add_argument('--candidates', type=int, default=0, help='With --opt, first score this many random weight sets in one batch and seed the optimizer with the best; '
+                                                                  'with --walk-forward, random weight sets tried on every train fold (default: 2000)')
+    parser.add_argument('--universe', action='store_true', help='With --opt, optimize the average result over the backtest group instead of VNQ alone')
+    parser.add_argument('--batch', type=int, help='With --opt --universe, weight sets evaluated per round (default: --workers)')
+    parser.add_argument('--live', action='store_true', help='Real-time loop that only processes the bars that arrived since the previous cycle')
+    parser.add_argument('--resample', action='store_true', help='In the real-time loop, download the hourly bars once and build the recent daily bars from them '
+                                                                 '(older daily bars are still downloaded, once)')
+    parser.add_argument('--result-cache', nargs='?', const='', metavar='FILE',
+                        help='In the real-time loop, reuse the analysis of symbols without new or changed bars and print the hit/miss counters '
+                             'after every cycle; with FILE also keep the analyses between runs')
+    parser.add_argument('--indicator-report', action='store_true', help='After every real-time cycle, print how often each indicator was computed and reused')
+    parser.add_argument('--profile', nargs='?', const='', metavar='FILE',
+                        help='Time every indicator, fetch and backtest phase and print a summary (after every cycle in the real-time loops); '
+                             'with FILE also write it as JSON. The --backtest worker processes are included, the process pools of '
+                             '--opt --universe, --walk-forward and --exit-sweep are not')
+    parser.add_argument('--lean', action='store_true', help='With --verify, run the prefix engine without copying every prefix or adding columns to it '
+                                                             '(--backtest uses the single pass engine, which never copies them)')
+    parser.add_argument('--float32', action='store_true', help='With --backtest or --verify, keep the single pass indicator values as float32 (half the memory, '
+                                                                'decisions near a threshold can differ)')
+    market_data.add_arguments(parser)
     args = parser.parse_args()
-
-    main(backtest=args.backtest, opt=args.opt)
+    if args.lean and not args.verify:
+        parser.error('--lean only applies to --verify')
+
+    # Colored output on Windows consoles
+    import colorama
+    colorama.init()
+
+    market_data.configure(args.replay, args.latency, args.jitter)
+    main(backtest=args.backtest, opt=args.opt, verify=args.verify, max_workers=args.workers, candidates=args.candidates,
+         universe=args.universe, batch_size=args.batch, live=args.live, indicator_report=args.indicator_report, profile=args.profile,
+         lean=args.lean, dtype=np.float32 if args.float32 else None, walk_forward=args.walk_forward, exit_sweep=args.exit_sweep, resample=args.resample,
+         cache_results=args.result_cache)
@@ -0,0 +1,245 @@
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import warnings
+from datetime import datetime, timedelta
+import pandas as pd
+import data_cache
+
+# Suppress the specific warning from yfinance
+warnings.filterwarnings("ignore", category=FutureWarning, module="yfinance")
+
+# Default directory of recorded market data for ReplayProvider
+REPLAY_DIR = 'replay_data'
+
+
+class MarketDataProvider:
+    """
+    Source of OHLCV bars and ticker info. Every download in the tools goes through the
+    provider set with set_provider, so the network can be swapped for recorded files.
+    """
+    # Whether downloads should go through the local OHLCV cache (data_cache)
+    cacheable = True
+
+    def download(self, ticker, start_date, end_date, interval, progress=False):
+        """
+        :return: Bars from start_date up to, but not including, end_date (empty DataFrame when there is no data).
+        """
+        raise NotImplementedError
+
+    def download_many(self, tickers, start_date, end_date, interval, progress=False, max_workers=4):
+        """
+        :return: Dict of ticker -> DataFrame (empty when there is no data for that ticker).
+        """
+        return {ticker: self.download(ticker, start_date, end_date, interval, progress) for ticker in tickers}
+
+    def info(self, ticker):
+        """
+        :return: Dict of ticker information, like yf.Ticker(ticker).info.
+        """
+        raise NotImplementedError
+
+    def tickers(self):
+        """
+        :return: List of the tickers this provider has data for, or None when it is not limited to a known list.
+        """
+        return None
+
+
+class YFinanceProvider(MarketDataProvider):
+
+    def __init__(self):
+        # yf.download keeps its results in a module level dict that every call resets,
+        # so two downloads must never run at the same time
+        self.download_lock = threading.Lock()
+
+    def download(self, ticker, start_date, end_date, interval, progress=False):
+        import yfinance as yf
+
+        with self.download_lock:
+            return yf.download(ticker, start=start_date, end=end_date, interval=interval, progress=progress)
+
+    def download_many(self, tickers, start_date, end_date, interval, progress=False, max_workers=4):
+        # One yf.download call for all tickers, using at most max_workers threads
+        import yfinance as yf
+
+        with self.download_lock:
+            stock_data = yf.download(tickers, start=start_date, end=end_date, interval=interval,
+                                     group_by='ticker', threads=max_workers, progress=progress)
+
+        if not isinstance(stock_data.columns, pd.MultiIndex):
+            return {tickers[0]: stock_data}
+        return {
+            ticker: stock_data[ticker].dropna(how='all') if ticker in stock_data.columns.get_level_values(0) else pd.DataFrame()
+            for ticker in tickers
+        }
+
+    def info(self, ticker):
+        import yfinance as yf
+
+        return yf.Ticker(ticker).info
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Serves bars and info recorded with record() from a local directory, without the network.
+    Bars are stored in the data_cache file format, one file per ticker and interval.
+    """
+    # The files are already local, caching them again would only copy them
+    cacheable = False
+
+    def __init__(self, directory=REPLAY_DIR):
+        self.directory = directory
+
+    def download(self, ticker, start_date, end_date, interval, progress=False):
+        bars, _ = data_cache.load_bars(ticker, interval, self.directory)
+        if bars is None:
+            return pd.DataFrame()
+        return data_cache._slice(bars, data_cache._day(start_date), data_cache._day(end_date))
+
+    def info(self, ticker):
+        with open(_info_path(ticker, self.directory)) as file:
+            return json.load(file)
+
+    def tickers(self):
+        # Tickers with recorded info, in name order
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-len('_info.json')] for name in os.listdir(self.directory) if name.endswith('_info.json'))
+
+
+class SimulatedLatencyProvider(MarketDataProvider):
+    """
+    Wraps another provider and sleeps before every call, to load test the concurrent code
+    paths on a machine without network.
+
+    :param latency: Seconds added to every call.
+    :param jitter: Up to this many extra seconds, drawn at random for every call.
+    """
+
+    def __init__(self, provider, latency=0.2, jitter=0.0, seed=None):
+        self.provider = provider
+        self.latency = latency
+        self.jitter = jitter
+        self.cacheable = provider.cacheable
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    def _wait(self):
+        self.calls += 1
+        time.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+    def download(self, ticker, start_date, end_date, interval, progress=False):
+        self._wait()
+        return self.provider.download(ticker, start_date, end_date, interval, progress)
+
+    def download_many(self, tickers, start_date, end_date, interval, progress=False, max_workers=4):
+        # A batched download is a single round trip
+        self._wait()
+        return self.provider.download_many(tickers, start_date, end_date, interval, progress, max_workers)
+
+    def info(self, ticker):
+        self._wait()
+        return self.provider.info(ticker)
+
+    def tickers(self):
+        return self.provider.tickers()
+
+
+provider = YFinanceProvider()
+
+# Options of the last configure() call, to set up the same provider in worker processes
+configuration = (None, 0.0, 0.0)
+
+def get_provider():
+    return provider
+
+
+def set_provider(new_provider):
+    global provider
+    provider = new_provider
+
+
+def configure(replay_dir=None, latency=0.0, jitter=0.0):
+    """
+    Set the provider from command line options: recorded files when replay_dir is given,
+    wrapped with a simulated latency when latency or jitter is above 0.
+    """
+    global configuration
+    configuration = (replay_dir, latency, jitter)
+
+    new_provider = ReplayProvider(replay_dir) if replay_dir else YFinanceProvider()
+    if latency or jitter:
+        new_provider = SimulatedLatencyProvider(new_provider, latency, jitter)
+    set_provider(new_provider)
+    return new_provider
+
+
+def init_worker(replay_dir=None, latency=0.0, jitter=0.0):
+    """
+    ProcessPoolExecutor initializer giving a worker the provider of the parent process.
+    Module globals are not inherited by spawned workers (the default on Windows and macOS):
+
+        ProcessPoolExecutor(initializer=market_data.init_worker, initargs=market_data.configuration)
+    """
+    configure(replay_dir, latency, jitter)
+
+
+def add_arguments(parser):
+    # Provider options shared by the command line tools
+    parser.add_argument('--replay', metavar='DIR', help='Serve market data recorded with market_data.py --record from DIR instead of the network')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of simulated latency added to every market data call')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many extra seconds of simulated latency per call')
+
+
+def _info_path(ticker, directory):
+    return os.path.join(directory, f"{ticker}_info.json")
+
+
+def record(tickers, start_date, end_date, interval, directory=REPLAY_DIR, source=None, with_info=False):
+    """
+    Download tickers with `source` (default: yfinance) and save them for ReplayProvider.
+
+    :return: List of the tickers that were recorded.
+    """
+    source = source or YFinanceProvider()
+    frames = source.download_many(tickers, start_date, end_date, interval)
+
+    recorded = []
+    for ticker in tickers:
+        frame = frames.get(ticker, pd.DataFrame())
+        if frame.empty:
+            print(f"No data found for {ticker}")
+            continue
+        data_cache.store_bars(ticker, interval, frame, start_date, end_date, directory)
+        recorded.append(ticker)
+
+        if with_info:
+            try:
+                info = source.info(ticker)
+            except Exception as e:
+                print(f"Error fetching info for {ticker}: {e}")
+                continue
+            with open(_info_path(ticker, directory), 'w') as file:
+                json.dump(info, file, default=str)
+
+    return recorded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Record market data for offline replay')
+    parser.add_argument('--record', nargs='+', metavar='TICKER', required=True, help='Tickers to record')
+    parser.add_argument('--days', type=int, default=365, help='Days of history to record (default: 365)')
+    parser.add_argument('--interval', nargs='+', default=['1d', '1h'], help='Intervals to record (default: 1d 1h)')
+    parser.add_argument('--info', action='store_true', help='Also record ticker info (used by etf_screener)')
+    parser.add_argument('--dir', default=REPLAY_DIR, help=f'Directory to record to (default: {REPLAY_DIR})')
+    args = parser.parse_args()
+
+    start_date = (datetime.now() - timedelta(days=args.days)).strftime("%Y-%m-%d")
+    end_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+    for i, interval in enumerate(args.interval):
+        recorded = record(args.record, start_date, end_date, interval, args.dir, with_info=args.info and i == 0)
+        print(f"Recorded {len(recorded)} tickers at {interval} in {args.dir}")
@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+from functools import wraps
+
+# Off by default: stage() then hands out one shared object that does nothing
+enabled = False
+
+# Stage name -> [calls, seconds]
+timings = {}
+timings_lock = threading.Lock()
+
+
+class _Stage:
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        with timings_lock:
+            entry = timings.setdefault(self.name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+        return False
+
+
+class _NoStage:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_no_stage = _NoStage()
+
+
+def stage(name):
+    """
+    Context manager adding the wall time of its block to `name`:
+
+        with profiling.stage('indicator rsi'):
+            ...
+
+    Stages can be nested; every stage counts its full time, including the stages inside it.
+    """
+    if not enabled:
+        return _no_stage
+    return _Stage(name)
+
+
+def profiled(name):
+    """
+    Decorator timing every call of a function as the stage `name`.
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with _Stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+
+def reset():
+    with timings_lock:
+        timings.clear()
+
+
+def merge(other_timings):
+    # Add the timings of another process (a copy of its `timings`) to this one's
+    with timings_lock:
+        for name, (calls, seconds) in other_timings.items():
+            entry = timings.setdefault(name, [0, 0.0])
+            entry[0] += calls
+            entry[1] += seconds
+
+
+def run_profiled(function, *args, **kwargs):
+    """
+    Call function in a worker process and return (result, timings of the call), so the parent
+    can merge() them. The timings are empty when profiling is off in the worker.
+    """
+    reset()
+    result = function(*args, **kwargs)
+    with timings_lock:
+        return result, {name: tuple(entry) for name, entry in timings.items()}
+
+
+def summary():
+    """
+    :return: List of (stage, calls, total seconds, milliseconds per call), slowest total first.
+    """
+    with timings_lock:
+        rows = [(name, calls, seconds, seconds / calls * 1000) for name, (calls, seconds) in timings.items()]
+    return sorted(rows, key=lambda row: -row[2])
+
+
+def print_summary():
+    rows = summary()
+    print(f"\n{'Stage':<40} {'Calls':>8} {'Total (s)':>10} {'Per call (ms)':>14}")
+    for name, calls, seconds, per_call in rows:
+        print(f"{name:<40} {calls:>8} {seconds:>10.3f} {per_call:>14.3f}")
+
+
+def write_summary(path):
+    # Same rows as print_summary, as JSON
+    with open(path, 'w') as file:
+        json.dump([
+            {'stage': name, 'calls': calls, 'seconds': seconds, 'ms_per_call': per_call}
+            for name, calls, seconds, per_call in summary()
+        ], file, indent=2)
@@ -0,0 +1,117 @@
+import argparse
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+# Analyses kept in memory; the least recently used one is dropped first
+MAX_ENTRIES = 1024
+
+# (ticker, interval, last bar timestamp, data fingerprint, weights hash) -> analysis dict
+entries = OrderedDict()
+entries_lock = threading.Lock()
+
+stats = {
+    'hits': 0,
+    'misses': 0,
+    'evictions': 0,
+}
+
+
+def fingerprint(data):
+    # Digest of every bar and column, so revised bars (splits, a still forming last bar) miss the cache
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(list(data.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def weights_hash(weights):
+    return hashlib.blake2b(repr(sorted(weights.items())).encode(), digest_size=16).hexdigest()
+
+
+def key(ticker, interval, data, weights):
+    last_bar = str(data.index[-1]) if len(data) else None
+    return ticker, interval, last_bar, fingerprint(data), weights_hash(weights)
+
+
+def get(cache_key):
+    """
+    :return: The analysis stored under cache_key, or None.
+    """
+    with entries_lock:
+        if cache_key not in entries:
+            stats['misses'] += 1
+            return None
+        entries.move_to_end(cache_key)
+        stats['hits'] += 1
+        return entries[cache_key]
+
+
+def _evict(max_entries):
+    # Called with entries_lock held
+    while len(entries) > max_entries:
+        entries.popitem(last=False)
+        stats['evictions'] += 1
+
+
+def put(cache_key, analysis, max_entries=MAX_ENTRIES):
+    with entries_lock:
+        entries[cache_key] = analysis
+        entries.move_to_end(cache_key)
+        _evict(max_entries)
+
+
+def load(path):
+    """
+    Add the analyses saved with save() to the ones in memory. A missing or unreadable file is ignored.
+
+    :return: Number of analyses loaded.
+    """
+    try:
+        with open(path, 'rb') as file:
+            saved = pickle.load(file)
+    except Exception:
+        return 0
+
+    with entries_lock:
+        for cache_key, analysis in saved.items():
+            entries.setdefault(cache_key, analysis)
+        _evict(MAX_ENTRIES)
+    return len(saved)
+
+
+def save(path):
+    with entries_lock:
+        saved = OrderedDict(entries)
+
+    # Write to a temporary file first so readers never see a half written file
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, 'wb') as file:
+        pickle.dump(saved, file)
+    os.replace(temporary_path, path)
+
+
+def clear(path=None):
+    """
+    Forget every analysis, and remove the file at path when given.
+    """
+    with entries_lock:
+        entries.clear()
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Cache of analyze_stock results')
+    parser.add_argument('--clear', metavar='FILE', help='Remove a result cache file written with main_analysis.py --result-cache FILE')
+    args = parser.parse_args()
+
+    if args.clear:
+        clear(args.clear)
+        print(f"Cleared {args.clear}")
@@ -0,0 +1,83 @@
+import argparse
+import os
+import shutil
+import threading
+import pandas as pd
+
+# Parsed spreadsheets are kept one pickle per file, next to the OHLCV cache
+CACHE_DIR = '.sheet_cache'
+
+# Sheets already loaded by this process: path -> (file signature, DataFrame)
+loaded = {}
+
+stats = {
+    'memory': 0,
+    'disk': 0,
+    'parsed': 0,
+}
+
+
+def _signature(path):
+    # Any edit to the spreadsheet changes its modification time or size
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _cache_path(path, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f"{os.path.basename(path)}.pkl")
+
+
+def load_sheet(path, cache_dir=CACHE_DIR):
+    """
+    First sheet of an Excel file as a DataFrame. The file is parsed once and the result is
+    reused, from memory in this process and from cache_dir in later ones, until the file changes.
+    """
+    signature = _signature(path)
+
+    if path in loaded and loaded[path][0] == signature:
+        stats['memory'] += 1
+        return loaded[path][1]
+
+    cache_path = _cache_path(path, cache_dir)
+    frame = None
+    if os.path.exists(cache_path):
+        try:
+            cached = pd.read_pickle(cache_path)
+            if cached['signature'] == signature:
+                frame = cached['frame']
+                stats['disk'] += 1
+        except Exception:
+            # Unreadable cache file, parse the spreadsheet again
+            frame = None
+
+    if frame is None:
+        frame = pd.read_excel(path)
+        stats['parsed'] += 1
+
+        # Write to a temporary file first so readers never see a half written file, one per
+        # process and thread since several runs may parse the same spreadsheet at once
+        os.makedirs(cache_dir, exist_ok=True)
+        temporary_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        pd.to_pickle({'signature': signature, 'frame': frame}, temporary_path)
+        os.replace(temporary_path, cache_path)
+
+    loaded[path] = (signature, frame)
+    return frame
+
+
+def clear(cache_dir=CACHE_DIR):
+    """
+    Forget every parsed sheet, in memory and on disk.
+    """
+    loaded.clear()
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Cache of parsed spreadsheets')
+    parser.add_argument('--clear', action='store_true', help='Remove the parsed spreadsheets')
+    args = parser.parse_args()
+
+    if args.clear:
+        clear()
+        print(f"Cleared {CACHE_DIR}")
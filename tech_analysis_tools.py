@@ -1,6 +1,55 @@
+import inspect
+from array import array
 from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
+import profiling
+
+def _shift(values, periods=1):
+    """
+    Shift a numpy array forward by `periods` bars, filling the start with NaN.
+    """
+    shifted = np.full(len(values), np.nan)
+    if periods < len(values):
+        shifted[periods:] = values[:len(values) - periods]
+    return shifted
+
+def _forward_fill_codes(codes):
+    """
+    Carry the last non-zero code forward to every following bar.
+    """
+    positions = np.where(codes != 0, np.arange(len(codes)), 0)
+    return codes[np.maximum.accumulate(positions)]
+
+def _recent_events(mask, values, count):
+    """
+    For every bar, the values of the last `count` events up to and including that bar,
+    oldest first. NaN until `count` events have happened.
+    """
+    positions = np.flatnonzero(mask)
+    seen = np.cumsum(mask)
+    recent = []
+    for k in range(count, 0, -1):
+        event = seen - k
+        valid = event >= 0
+        result = np.full(len(mask), np.nan)
+        result[valid] = values[positions[event[valid]]]
+        recent.append(result)
+    return recent
+
+def _three_bar_peak(values):
+    """
+    True at bar i when bar i-1 is higher than both of its neighbours.
+    """
+    middle = _shift(values, 1)
+    return (middle > _shift(values, 2)) & (middle > values)
+
+def _three_bar_trough(values):
+    """
+    True at bar i when bar i-1 is lower than both of its neighbours.
+    """
+    middle = _shift(values, 1)
+    return (middle < _shift(values, 2)) & (middle < values)
 
 def calculate_rsi(data, window=14):
     delta = data['Close'].diff(1)
@@ -18,9 +67,11 @@ def calculate_rsi(data, window=14):
 def calculate_ema(data, window):
     return data['Close'].ewm(span=window, adjust=False).mean()
 
-def calculate_macd(data, fast_length=12, slow_length=26, signal_length=9):
-    ema_fast = calculate_ema(data, fast_length)
-    ema_slow = calculate_ema(data, slow_length)
+def calculate_macd(data, fast_length=12, slow_length=26, signal_length=9, ema_fast=None, ema_slow=None):
+    if ema_fast is None:
+        ema_fast = calculate_ema(data, fast_length)
+    if ema_slow is None:
+        ema_slow = calculate_ema(data, slow_length)
     macd_line = ema_fast - ema_slow
     signal_line = macd_line.ewm(span=signal_length, adjust=False).mean()
     macd_histogram = macd_line - signal_line
@@ -35,96 +86,167 @@ def calculate_vwap(data):
 def calculate_sma(data, window):
     return data['Close'].rolling(window=window).mean()
 
-def check_golden_cross(data):
-    sma_50 = calculate_sma(data, 50)
-    sma_200 = calculate_sma(data, 200)
+def check_golden_cross(data, sma_50=None, sma_200=None):
+    if sma_50 is None:
+        sma_50 = calculate_sma(data, 50)
+    if sma_200 is None:
+        sma_200 = calculate_sma(data, 200)
     golden_cross = (sma_50.iloc[-1] > sma_200.iloc[-1]) and (sma_50.iloc[-2] <= sma_200.iloc[-2])
     return golden_cross
 
 def calculate_vma(data, window=20):
     return data['Volume'].rolling(window=window).mean()
 
-def analyze_volume_trend(data, window=20):
-    data['VMA'] = calculate_vma(data, window)
+def volume_trend_signal(data, window=20, vma=None, add_columns=True):
+    if vma is None:
+        vma = calculate_vma(data, window)
+    if add_columns:
+        data['VMA'] = vma
     latest_volume = data['Volume'].iloc[-1]
-    vma = data['VMA'].iloc[-1]
+    vma = vma.iloc[-1]
 
     if latest_volume > vma:
-        volume_trend = 'Increasing Volume (Buy Signal)'
+        volume_trend = VOLUME_INCREASING
     else:
-        volume_trend = 'Decreasing Volume (Sell Signal)'
+        volume_trend = VOLUME_DECREASING
 
     return volume_trend
 
-def calculate_parabolic_sar(data, step=0.02, max_step=0.2):
+def analyze_volume_trend(data, window=20):
+    return signal_message(volume_trend_signal(data, window))
+
+def parabolic_sar_array(high, low, close, step=0.02, max_step=0.2):
     """
-    Calculate Parabolic SAR for the given data.
+    Parabolic SAR over raw arrays.
+
+    :param high: 1-D array of highs, or 2-D array (bars x tickers) to run many tickers at once.
+                 The 2-D form steps all tickers together and pays off from a few hundred tickers.
+    :param low: Array of lows with the same shape as high.
+    :param close: Array of closes with the same shape as high.
+    :return: Array of SAR values with the same shape as the inputs.
     """
-    high = data['High']
-    low = data['Low']
-    close = data['Close']
-    
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    close = np.asarray(close, dtype=float)
+
+    if len(close) == 0:
+        return np.empty(close.shape)
+    if close.ndim == 2:
+        return _parabolic_sar_batch(high, low, close, step, max_step)
+
+    # Indexing a memoryview gives plain floats, much cheaper to loop over than numpy scalars,
+    # without the per-value objects of a list copy. The output grows in a compact array of doubles.
+    high = memoryview(np.ascontiguousarray(high))
+    low = memoryview(np.ascontiguousarray(low))
+    close = memoryview(np.ascontiguousarray(close))
+
     # Initialize variables
     af = step
     uptrend = True
-    ep = low.iloc[0]  # Extreme point
-    sar = high.iloc[0]  # SAR value
-    sar_values = [sar]
-    
+    ep = low[0]  # Extreme point
+    sar = high[0]  # SAR value
+    sar_values = array('d', [sar])
+
     for i in range(1, len(close)):
         if uptrend:
             sar = sar + af * (ep - sar)
-            if close.iloc[i] < sar:
+            if close[i] < sar:
                 uptrend = False
                 sar = ep
                 af = step
-                ep = low.iloc[i]
+                ep = low[i]
         else:
             sar = sar - af * (sar - ep)
-            if close.iloc[i] > sar:
+            if close[i] > sar:
                 uptrend = True
                 sar = ep
                 af = step
-                ep = high.iloc[i]
-        
+                ep = high[i]
+
         if uptrend:
-            if high.iloc[i] > ep:
-                ep = high.iloc[i]
+            if high[i] > ep:
+                ep = high[i]
                 af = min(af + step, max_step)
         else:
-            if low.iloc[i] < ep:
-                ep = low.iloc[i]
+            if low[i] < ep:
+                ep = low[i]
                 af = min(af + step, max_step)
-        
+
         sar_values.append(sar)
-    
-    data['Parabolic_SAR'] = sar_values
+
+    return np.frombuffer(sar_values, dtype=float)
+
+def _parabolic_sar_batch(high, low, close, step, max_step):
+    """
+    Same steps as parabolic_sar_array, applied to every ticker (column) at once.
+    """
+    af = np.full(close.shape[1], step)
+    uptrend = np.ones(close.shape[1], dtype=bool)
+    ep = low[0].copy()
+    sar = high[0].copy()
+    sar_values = np.empty(close.shape)
+    sar_values[0] = sar
+
+    for i in range(1, len(close)):
+        sar = np.where(uptrend, sar + af * (ep - sar), sar - af * (sar - ep))
+
+        # Reversals
+        to_downtrend = uptrend & (close[i] < sar)
+        to_uptrend = ~uptrend & (close[i] > sar)
+        reversal = to_downtrend | to_uptrend
+        sar = np.where(reversal, ep, sar)
+        af = np.where(reversal, step, af)
+        ep = np.where(to_downtrend, low[i], np.where(to_uptrend, high[i], ep))
+        uptrend = (uptrend & ~to_downtrend) | to_uptrend
+
+        # New extreme point in the current trend
+        new_extreme = np.where(uptrend, high[i] > ep, low[i] < ep)
+        ep = np.where(new_extreme, np.where(uptrend, high[i], low[i]), ep)
+        af = np.where(new_extreme, np.minimum(af + step, max_step), af)
+
+        sar_values[i] = sar
+
+    return sar_values
+
+def calculate_parabolic_sar(data, step=0.02, max_step=0.2):
+    """
+    Calculate Parabolic SAR for the given data.
+    """
+    data['Parabolic_SAR'] = parabolic_sar_array(data['High'], data['Low'], data['Close'], step, max_step)
     return data
 
-def analyze_parabolic_sar(data):
-        # Calculate Parabolic SAR
-    latest_sar = data['Parabolic_SAR'].iloc[-1]
-    previous_sar = data['Parabolic_SAR'].iloc[-2]
+def parabolic_sar_signal(data, parabolic_sar=None):
+    # The Parabolic_SAR column added by calculate_parabolic_sar, unless the values are given
+    if parabolic_sar is None:
+        parabolic_sar = data['Parabolic_SAR']
+    parabolic_sar = np.asarray(parabolic_sar)
+    latest_sar = parabolic_sar[-1]
+    previous_sar = parabolic_sar[-2]
     latest_close = data['Close'].iloc[-1]
     
     if latest_close > latest_sar and previous_sar >= data['Close'].iloc[-2]:
-        return "Reversal to Uptrend (Buy Signal)"
+        return SAR_REVERSAL_UP
     elif latest_close < latest_sar and previous_sar <= data['Close'].iloc[-2]:
-        return "Reversal to Downtrend (Sell Signal)"
+        return SAR_REVERSAL_DOWN
     else:
-        return "No Clear Reversal"
+        return SAR_NO_REVERSAL
+
+def analyze_parabolic_sar(data):
+    return signal_message(parabolic_sar_signal(data))
 
 
-def calculate_bollinger_bands(data, window=20, num_std_dev=2):
+def calculate_bollinger_bands(data, window=20, num_std_dev=2, rolling_mean=None):
     """
     Calculate Bollinger Bands for the given data.
 
     :param data: DataFrame containing the stock price data.
     :param window: The window size for the moving average (default is 20).
     :param num_std_dev: Number of standard deviations for the bands (default is 2).
+    :param rolling_mean: The moving average (calculate_sma with the same window), computed when not given.
     :return: Series for upper and lower Bollinger Bands.
     """
-    rolling_mean = data['Close'].rolling(window).mean()
+    if rolling_mean is None:
+        rolling_mean = calculate_sma(data, window)
     rolling_std = data['Close'].rolling(window).std()
 
     bollinger_upper = rolling_mean + (rolling_std * num_std_dev)
@@ -200,43 +322,164 @@ def is_doji(data, index):
     body = abs(data['Close'].iloc[index] - data['Open'].iloc[index])
     return body <= (data['High'].iloc[index] - data['Low'].iloc[index]) * 0.1
 
+# Candlestick pattern codes, in the priority order they are checked. Their messages are the first entries of SIGNALS.
+NO_PATTERN, HAMMER, SHOOTING_STAR, BULLISH_ENGULFING, BEARISH_ENGULFING, DOJI_BULLISH, DOJI_BEARISH = range(7)
+
+# Signal directions
+SELL, NEUTRAL, BUY = -1, 0, 1
+
+# Status codes of the other indicators, numbered after the candlestick pattern codes
+(NEUTRAL_ZONE, OVERBOUGHT, OVERSOLD,
+ MACD_BULLISH, MACD_BEARISH,
+ NO_REVERSAL, MACD_REVERSAL_BULLISH, MACD_REVERSAL_BEARISH,
+ UNDER_VWAP, OVER_VWAP,
+ GOLDEN_CROSS, NO_GOLDEN_CROSS,
+ SAR_REVERSAL_UP, SAR_REVERSAL_DOWN, SAR_NO_REVERSAL,
+ VOLUME_INCREASING, VOLUME_DECREASING,
+ NEAR_UPPER_BAND, NEAR_LOWER_BAND, WITHIN_BANDS,
+ NO_DIVERGENCE, BEARISH_DIVERGENCE, BULLISH_DIVERGENCE,
+ NO_HEAD_AND_SHOULDERS, HEAD_AND_SHOULDERS, INVERSE_HEAD_AND_SHOULDERS,
+ NO_DOUBLE_TOP_BOTTOM, DOUBLE_TOP, DOUBLE_BOTTOM,
+ FIB_BELOW_236, FIB_236_TO_382, FIB_382_TO_50, FIB_50_TO_618, FIB_AT_618, FIB_ABOVE_618, FIB_NO_SIGNAL) = range(7, 43)
+
+# Message and direction of every status code. Indicators report codes; the messages are only for printing.
+SIGNALS = [
+    ("No pattern found", NEUTRAL),
+    ("Hammer (Buy Signal)", BUY),
+    ("Shooting Star (Sell Signal)", SELL),
+    ("Bullish Engulfing (Buy Signal)", BUY),
+    ("Bearish Engulfing (Sell Signal)", SELL),
+    ("Doji Bullish (Buy Signal)", BUY),
+    ("Doji Bearish (Sell Signal)", SELL),
+    ("Neutral", NEUTRAL),
+    ("Overbought (Sell Signal)", SELL),
+    ("Oversold (Buy Signal)", BUY),
+    ("Bullish (Buy Signal)", BUY),
+    ("Bearish (Sell Signal)", SELL),
+    ("No Reversal", NEUTRAL),
+    ("Reversal to Bullish (Buy Signal)", BUY),
+    ("Reversal to Bearish (Sell Signal)", SELL),
+    ("Current Price is Under VWAP (Buy Signal)", BUY),
+    ("Current Price is Over VWAP (Sell Signal)", SELL),
+    ("Golden Cross (Strong Buy Signal)", BUY),
+    ("No Golden Cross", NEUTRAL),
+    ("Reversal to Uptrend (Buy Signal)", BUY),
+    ("Reversal to Downtrend (Sell Signal)", SELL),
+    ("No Clear Reversal", NEUTRAL),
+    ("Increasing Volume (Buy Signal)", BUY),
+    ("Decreasing Volume (Sell Signal)", SELL),
+    ("Price near Upper Bollinger Band (Sell Signal)", SELL),
+    ("Price near Lower Bollinger Band (Buy Signal)", BUY),
+    ("Price within Bollinger Bands (Neutral)", NEUTRAL),
+    ("No Divergence", NEUTRAL),
+    ("Bearish Divergence (Sell Signal)", SELL),
+    ("Bullish Divergence (Buy Signal)", BUY),
+    ("No Head/Shoulders", NEUTRAL),
+    ("Head/Shoulders (Sell Signal)", SELL),
+    ("Inverse Head/Shoulders (Buy Signal)", BUY),
+    ("No Double Top/Bottom Pattern", NEUTRAL),
+    ("Double Top (Sell Signal)", SELL),
+    ("Double Bottom (Buy Signal)", BUY),
+    ("Below 23.6% Level (Buy Signal)", BUY),
+    ("Between 23.6% and 38.2% Levels (Buy Signal)", BUY),
+    ("Between 38.2% and 50% Levels (Buy Signal)", BUY),
+    ("Between 50% and 61.8% Levels (Sell Signal)", SELL),
+    ("At 61.8% Level (Potential Reversal Signal)", NEUTRAL),
+    ("Above 61.8% Level (Sell Signal)", SELL),
+    ("No Clear Signal", NEUTRAL),
+]
+
+SIGNAL_MESSAGES = np.array([message for message, _ in SIGNALS], dtype=object)
+SIGNAL_DIRECTIONS = np.array([direction for _, direction in SIGNALS], dtype=np.int8)
+
+def signal_message(code):
+    # Text of a status code, for printing
+    return SIGNAL_MESSAGES[code]
+
+def candlestick_pattern_codes(data):
+    """
+    Code of the pattern found on every bar (NO_PATTERN when there is none).
+    Same checks as is_hammer, is_shooting_star, is_engulfing and is_doji, applied to whole columns.
+    """
+    open_ = data['Open'].to_numpy(dtype=float)
+    high = data['High'].to_numpy(dtype=float)
+    low = data['Low'].to_numpy(dtype=float)
+    close = data['Close'].to_numpy(dtype=float)
+    previous_open = _shift(open_)
+    previous_close = _shift(close)
+
+    body = np.abs(close - open_)
+    lower_shadow = open_ - low
+    upper_shadow = high - close
+
+    hammer = (lower_shadow > 2 * body) & (upper_shadow <= body)
+    shooting_star = (upper_shadow > 2 * body) & (lower_shadow <= body)
+    engulfing = ((open_ < close) & (previous_open > previous_close) &
+                 (open_ < previous_close) & (close > previous_open))
+    doji = body <= (high - low) * 0.1
+
+    codes = np.select(
+        [hammer, shooting_star, engulfing & (open_ < close), engulfing, doji & (close > open_), doji],
+        [HAMMER, SHOOTING_STAR, BULLISH_ENGULFING, BEARISH_ENGULFING, DOJI_BULLISH, DOJI_BEARISH],
+        NO_PATTERN
+    ).astype(np.int8)
+    codes[:1] = NO_PATTERN  # The first bar has no previous candle and is never scanned
+    return codes
+
+def latest_candlestick_pattern(data, chunk=64):
+    """
+    Code of the most recent candlestick pattern. Scans back from the last bar in growing
+    chunks, so usually only the last few bars are looked at.
+    """
+    size = chunk
+    while True:
+        # One extra bar so the first bar of the chunk has its previous candle
+        start = max(len(data) - size - 1, 0)
+        codes = candlestick_pattern_codes(data.iloc[start:])
+        found = np.flatnonzero(codes)
+        if len(found):
+            return int(codes[found[-1]])
+        if start == 0:
+            return NO_PATTERN
+        size *= 4
+
 def analyze_candlestick_patterns(data):
-    signals = []
-    for i in range(1, len(data)):
-        if is_hammer(data, i):
-            signals.append("Hammer (Buy Signal)")
-        elif is_shooting_star(data, i):
-            signals.append("Shooting Star (Sell Signal)")
-        elif is_engulfing(data, i):
-            if data['Open'].iloc[i] < data['Close'].iloc[i]:
-                signals.append("Bullish Engulfing (Buy Signal)")
-            else:
-                signals.append("Bearish Engulfing (Sell Signal)")
-        elif is_doji(data, i):
-            if data['Close'].iloc[i] > data['Open'].iloc[i]:
-                signals.append("Doji Bullish (Buy Signal)")
-            else:
-                signals.append("Doji Bearish (Sell Signal)")
-
-    if signals:
-        return signals[-1]  # Return only the most recent candlestick pattern signal
-    return "No pattern found"  # Return a message when no pattern is found
-
-def calculate_adx(data, window=14):
+    # Return only the most recent candlestick pattern signal, or "No pattern found"
+    return signal_message(latest_candlestick_pattern(data))
+
+def candlestick_pattern_history(data, codes=None):
+    """
+    Code of the most recent candlestick pattern as of every bar.
+
+    :param codes: Per-bar codes from candlestick_pattern_codes, computed when not given.
+    """
+    if codes is None:
+        codes = candlestick_pattern_codes(data)
+    return pd.Series(_forward_fill_codes(codes), index=data.index)
+
+def calculate_true_range(data):
     high = data['High']
     low = data['Low']
     close = data['Close']
 
-    plus_dm = high.diff()
-    minus_dm = low.diff()
+    tr1 = high - low
+    tr2 = abs(high - close.shift(1))
+    tr3 = abs(low - close.shift(1))
+
+    # Same result as tr1.combine(tr2, max).combine(tr3, max) (max keeps the first value unless
+    # the second is greater, so NaNs resolve the same way) without a Python call per bar
+    true_range = tr1.where(~(tr2 > tr1), tr2)
+    return true_range.where(~(tr3 > true_range), tr3)
+
+def calculate_adx(data, window=14, true_range=None):
+    plus_dm = data['High'].diff()
+    minus_dm = data['Low'].diff()
 
     plus_dm[plus_dm < 0] = 0
     minus_dm[minus_dm > 0] = 0
 
-    tr1 = high - low
-    tr2 = abs(high - close.shift(1))
-    tr3 = abs(low - close.shift(1))
-    true_range = tr1.combine(tr2, max).combine(tr3, max)
+    if true_range is None:
+        true_range = calculate_true_range(data)
 
     atr = true_range.rolling(window=window).mean()
 
@@ -248,8 +491,9 @@ def calculate_adx(data, window=14):
 
     return adx
 
-def analyze_adx(data, adx_threshold=25):
-    adx = calculate_adx(data)
+def analyze_adx(data, adx_threshold=25, adx=None):
+    if adx is None:
+        adx = calculate_adx(data)
     latest_adx = adx.iloc[-1]
 
     if latest_adx >= adx_threshold:
@@ -258,108 +502,161 @@ def analyze_adx(data, adx_threshold=25):
         return f"Weak/No Trend (ADX: {latest_adx:.2f})"
 
 
-def detect_rsi_divergence(data):
-    rsi = calculate_rsi(data)
-    price_highs = data['High'].rolling(window=3).apply(lambda x: x.iloc[1] if (x.iloc[1] > x.iloc[0] and x.iloc[1] > x.iloc[2]) else np.nan, raw=False)
-    rsi_highs = rsi.rolling(window=3).apply(lambda x: x.iloc[1] if (x.iloc[1] > x.iloc[0] and x.iloc[1] > x.iloc[2]) else np.nan, raw=False)
-
-    last_signal = "No Divergence"
-
-    for i in range(2, len(rsi)):
-        price_high = price_highs.iloc[i]
-        rsi_high = rsi_highs.iloc[i]
-
-        # Check if price_high and rsi_high are not NaN
-        if pd.notna(price_high) and pd.notna(rsi_high):
-            # Bearish divergence: Price makes a higher high, RSI makes a lower high
-            if data['High'].iloc[i] > data['High'].iloc[i-2] and rsi.iloc[i] < rsi.iloc[i-2]:
-                last_signal = "Bearish Divergence (Sell Signal)"
-            # Bullish divergence: Price makes a lower low, RSI makes a higher low
-            elif data['Low'].iloc[i] < data['Low'].iloc[i-2] and rsi.iloc[i] > rsi.iloc[i-2]:
-                last_signal = "Bullish Divergence (Buy Signal)"
-    
-    # Return the last signal or "No Divergence"
-    return last_signal
+def swing_points(data, lookback=5):
+    """
+    Swing highs and lows of a frame, found once with array comparisons and shared by the
+    RSI divergence, Head and Shoulders and Double Top/Bottom detectors.
+
+    :param lookback: Window of the Double Top/Bottom extremes.
+    :return: Dict of arrays with one value per bar:
+             'peak' / 'trough': the previous bar is higher / lower than both of its neighbours,
+             'peak_value' / 'trough_value': High / Low of that previous bar,
+             'window_max' / 'window_min': position of the highest High / lowest Low inside the
+             `lookback` bars ending at each bar (NaN where the window is incomplete or holds a NaN).
+    """
+    high = data['High'].to_numpy(dtype=float)
+    low = data['Low'].to_numpy(dtype=float)
+
+    return {
+        'peak': _three_bar_peak(high),
+        'trough': _three_bar_trough(low),
+        'peak_value': _shift(high),
+        'trough_value': _shift(low),
+        'window_max': _window_extreme_positions(high, lookback, True),
+        'window_min': _window_extreme_positions(low, lookback, False),
+    }
+
+def rsi_divergence_history(data, rsi=None, swings=None):
+    """
+    Last RSI divergence code as of every bar: a swing high in both price and RSI is bearish when
+    price makes a higher high and RSI a lower one, bullish when price makes a lower low and RSI a higher one.
 
+    :param rsi: RSI of the data, computed when not given.
+    :param swings: swing_points of the data, computed when not given.
+    """
+    if rsi is None:
+        rsi = calculate_rsi(data)
+    if swings is None:
+        swings = swing_points(data)
+    rsi = np.asarray(rsi, dtype=float)
+    high = data['High'].to_numpy(dtype=float)
+    low = data['Low'].to_numpy(dtype=float)
+
+    both_highs = swings['peak'] & _three_bar_peak(rsi)
+    bearish = both_highs & (high > _shift(high, 2)) & (rsi < _shift(rsi, 2))
+    bullish = both_highs & ~bearish & (low < _shift(low, 2)) & (rsi > _shift(rsi, 2))
+
+    codes = _forward_fill_codes(np.select([bearish, bullish], [1, 2], 0))
+    return pd.Series(np.array([NO_DIVERGENCE, BEARISH_DIVERGENCE, BULLISH_DIVERGENCE])[codes], index=data.index)
+
+def rsi_divergence_signal(data, swings=None, rsi=None):
+    if len(data) == 0:
+        return NO_DIVERGENCE
+    return int(rsi_divergence_history(data, rsi, swings).iloc[-1])
 
-def detect_head_and_shoulders(data):
+def detect_rsi_divergence(data):
+    return signal_message(rsi_divergence_signal(data))
+
+def head_and_shoulders_history(data, swings=None):
     """
-    Detects Head and Shoulders (Bearish) or Inverse Head and Shoulders (Bullish) pattern.
-    Returns a signal if pattern is found.
+    Head and Shoulders code as of every bar, from the last three swing highs and swing lows.
+
+    :param swings: swing_points of the data, computed when not given.
     """
+    if swings is None:
+        swings = swing_points(data)
 
-    # Find local peaks and troughs (using rolling window approach)
-    data['Peak'] = data['High'].rolling(window=3).apply(lambda x: x.iloc[1] if x.iloc[1] > x.iloc[0] and x.iloc[1] > x.iloc[2] else np.nan)
-    data['Trough'] = data['Low'].rolling(window=3).apply(lambda x: x.iloc[1] if x.iloc[1] < x.iloc[0] and x.iloc[1] < x.iloc[2] else np.nan)
+    left_peak, head_peak, right_peak = _recent_events(swings['peak'], swings['peak_value'], 3)
+    left_trough, head_trough, right_trough = _recent_events(swings['trough'], swings['trough_value'], 3)
 
-    # Collect the peaks and troughs for pattern detection
-    peaks = data['Peak'].dropna()
-    troughs = data['Trough'].dropna()
+    bearish = ((left_peak < head_peak) & (head_peak > right_peak) &
+               (left_trough < head_trough) & (head_trough < right_trough))
+    bullish = ((left_peak > head_peak) & (head_peak < right_peak) &
+               (left_trough > head_trough) & (head_trough < right_trough))
 
-    if len(peaks) >= 3 and len(troughs) >= 3:
-        # We assume peaks and troughs follow the pattern sequence
-        left_shoulder_peak = peaks.iloc[-3]
-        head_peak = peaks.iloc[-2]
-        right_shoulder_peak = peaks.iloc[-1]
+    return pd.Series(np.select(
+        [bearish, bullish],
+        [HEAD_AND_SHOULDERS, INVERSE_HEAD_AND_SHOULDERS],
+        NO_HEAD_AND_SHOULDERS
+    ), index=data.index)
 
-        left_shoulder_trough = troughs.iloc[-3]
-        head_trough = troughs.iloc[-2]
-        right_shoulder_trough = troughs.iloc[-1]
+def head_and_shoulders_signal(data, swings=None, add_columns=True):
+    """
+    Detects Head and Shoulders (Bearish) or Inverse Head and Shoulders (Bullish) pattern.
+    Returns a signal code if pattern is found.
 
-        # Head and Shoulders pattern detection (Bearish)
-        if left_shoulder_peak < head_peak > right_shoulder_peak and left_shoulder_trough < head_trough < right_shoulder_trough:
-            return "Head/Shoulders (Sell Signal)"
+    :param add_columns: Add the Peak and Trough columns to data.
+    """
+    if swings is None:
+        swings = swing_points(data)
 
-        # Inverse Head and Shoulders pattern detection (Bullish)
-        elif left_shoulder_peak > head_peak < right_shoulder_peak and left_shoulder_trough > head_trough < right_shoulder_trough:
-            return "Inverse Head/Shoulders (Buy Signal)"
-    
-    return "No Head/Shoulders"
+    if add_columns:
+        # Local peaks and troughs, at the bar after them
+        data['Peak'] = np.where(swings['peak'], swings['peak_value'], np.nan)
+        data['Trough'] = np.where(swings['trough'], swings['trough_value'], np.nan)
 
+    if len(data) == 0:
+        return NO_HEAD_AND_SHOULDERS
+    return int(head_and_shoulders_history(data, swings).iloc[-1])
 
+def detect_head_and_shoulders(data):
+    return signal_message(head_and_shoulders_signal(data))
 
-def detect_double_top_bottom(data, lookback=5, tolerance=0.02):
+def _window_extreme_positions(values, lookback, use_max):
+    """
+    Position of the max (or min) inside the `lookback` bars ending at every bar,
+    NaN where the window is incomplete or holds a NaN.
+    """
+    positions = np.full(len(values), np.nan)
+    if len(values) < lookback:
+        return positions
+    windows = np.lib.stride_tricks.sliding_window_view(values, lookback)
+    extreme = windows.argmax(axis=1) if use_max else windows.argmin(axis=1)
+    positions[lookback - 1:] = np.where(np.isnan(windows).any(axis=1), np.nan, extreme)
+    return positions
+
+def double_top_bottom_history(data, lookback=5, tolerance=0.02, swings=None):
+    """
+    Double Top/Bottom code as of every bar: the extremes of the last two `lookback` windows
+    are within `tolerance` of each other.
+
+    :param swings: swing_points of the data computed with the same lookback, computed when not given.
+    """
+    if swings is None:
+        swings = swing_points(data, lookback)
+    high = data['High'].to_numpy(dtype=float)
+    low = data['Low'].to_numpy(dtype=float)
+
+    def matching_pair(values, positions):
+        first, second = _recent_events(~np.isnan(positions), positions, 2)
+        valid = ~np.isnan(first)
+        # The window positions are looked up from the start of the data, as the detector always has
+        first_value = values[np.where(valid, first, 0).astype(int)]
+        second_value = values[np.where(valid, second, 0).astype(int)]
+        return valid & (np.abs(first_value - second_value) / first_value < tolerance)
+
+    return pd.Series(np.select(
+        [matching_pair(high, swings['window_max']), matching_pair(low, swings['window_min'])],
+        [DOUBLE_TOP, DOUBLE_BOTTOM],
+        NO_DOUBLE_TOP_BOTTOM
+    ), index=data.index)
+
+def double_top_bottom_signal(data, lookback=5, tolerance=0.02, swings=None):
     """
     Detects Double Top (Bearish) and Double Bottom (Bullish) patterns.
 
     :param data: DataFrame containing stock price data with 'High' and 'Low' columns.
     :param lookback: The number of periods to look back for the pattern.
     :param tolerance: The tolerance level for price similarity between peaks or troughs.
-    :return: A string indicating the detected pattern, if any.
-    """
-    # Get local peaks
-    peaks = data['High'].rolling(window=lookback).apply(
-        lambda x: x.argmax() if not np.isnan(x).any() else np.nan, raw=True
-    )
-    troughs = data['Low'].rolling(window=lookback).apply(
-        lambda x: x.argmin() if not np.isnan(x).any() else np.nan, raw=True
-    )
-
-    # Ensure peaks and troughs are aligned with indexes
-    peaks = peaks.dropna().astype(int)  # Indices where peaks are found
-    troughs = troughs.dropna().astype(int)  # Indices where troughs are found
-
-    # Double Top Pattern
-    if len(peaks) >= 2:
-        peak1 = peaks.iloc[-2]
-        peak2 = peaks.iloc[-1]
-        price_diff = abs(data['High'].iloc[peak1] - data['High'].iloc[peak2])
-        
-        # Check if peaks are within the tolerance level
-        if price_diff / data['High'].iloc[peak1] < tolerance:
-            return "Double Top (Sell Signal)"
-
-    # Double Bottom Pattern
-    if len(troughs) >= 2:
-        trough1 = troughs.iloc[-2]
-        trough2 = troughs.iloc[-1]
-        price_diff = abs(data['Low'].iloc[trough1] - data['Low'].iloc[trough2])
-        
-        # Check if troughs are within the tolerance level
-        if price_diff / data['Low'].iloc[trough1] < tolerance:
-            return "Double Bottom (Buy Signal)"
-    
-    return "No Double Top/Bottom Pattern"
+    :param swings: swing_points of the data computed with the same lookback, computed when not given.
+    :return: A signal code indicating the detected pattern, if any.
+    """
+    if len(data) == 0:
+        return NO_DOUBLE_TOP_BOTTOM
+    return int(double_top_bottom_history(data, lookback, tolerance, swings).iloc[-1])
+
+def detect_double_top_bottom(data, lookback=5, tolerance=0.02):
+    return signal_message(double_top_bottom_signal(data, lookback, tolerance))
 
 
 def calculate_fibonacci_levels(data):
@@ -378,29 +675,140 @@ def calculate_fibonacci_levels(data):
     }
     return fib_levels
 
-def analyze_fibonacci_signal(data):
+def fibonacci_signal(data):
     """
-    Generate a simple buy/sell signal based on Fibonacci retracement levels with descriptions.
+    Generate a simple buy/sell signal code based on Fibonacci retracement levels.
     """
     fib_levels = calculate_fibonacci_levels(data)
     current_price = data['Close'].iloc[-1]
 
     # Define conditions for buy and sell signals based on price interaction with Fibonacci levels
     if current_price < fib_levels['23.6%']:
-        return "Below 23.6% Level (Buy Signal)"
+        return FIB_BELOW_236
     elif current_price < fib_levels['38.2%']:
-        return "Between 23.6% and 38.2% Levels (Buy Signal)"
+        return FIB_236_TO_382
     elif current_price < fib_levels['50%']:
-        return "Between 38.2% and 50% Levels (Buy Signal)"
+        return FIB_382_TO_50
     elif current_price < fib_levels['61.8%']:
-        return "Between 50% and 61.8% Levels (Sell Signal)"
+        return FIB_50_TO_618
     elif current_price == fib_levels['61.8%']:
-        return "At 61.8% Level (Potential Reversal Signal)"
+        return FIB_AT_618
     elif current_price > fib_levels['61.8%']:
-        return "Above 61.8% Level (Sell Signal)"
+        return FIB_ABOVE_618
     else:
-        return "No Clear Signal"
+        return FIB_NO_SIGNAL
 
+def analyze_fibonacci_signal(data):
+    """
+    Generate a simple buy/sell signal based on Fibonacci retracement levels with descriptions.
+    """
+    return signal_message(fibonacci_signal(data))
+
+def fibonacci_signal_history(data):
+    """
+    Fibonacci signal code as of every bar, using the high/low seen up to that bar.
+    """
+    recent_high = np.fmax.accumulate(data['High'].to_numpy(dtype=float))
+    recent_low = np.fmin.accumulate(data['Low'].to_numpy(dtype=float))
+    current_price = data['Close'].to_numpy(dtype=float)
+
+    level_236 = recent_high - (recent_high - recent_low) * 0.236
+    level_382 = recent_high - (recent_high - recent_low) * 0.382
+    level_50 = recent_high - (recent_high - recent_low) * 0.5
+    level_618 = recent_high - (recent_high - recent_low) * 0.618
+
+    return pd.Series(np.select(
+        [current_price < level_236, current_price < level_382, current_price < level_50,
+         current_price < level_618, current_price == level_618, current_price > level_618],
+        [FIB_BELOW_236, FIB_236_TO_382, FIB_382_TO_50, FIB_50_TO_618, FIB_AT_618, FIB_ABOVE_618],
+        FIB_NO_SIGNAL
+    ), index=data.index)
+
+
+
+# Indicators an IndicatorContext can compute, by name. Each entry takes the context first and asks it
+# for the indicators it depends on, so a shared input (an EMA, an SMA, the true range) is computed once.
+INDICATOR_GRAPH = {
+    'rsi': lambda context, window=14: calculate_rsi(context.data, window),
+    'ema': lambda context, window: calculate_ema(context.data, window),
+    'macd': lambda context, fast_length=12, slow_length=26, signal_length=9: calculate_macd(
+        context.data, fast_length, slow_length, signal_length,
+        context.get('ema', window=fast_length), context.get('ema', window=slow_length)),
+    'vwap': lambda context: calculate_vwap(context.data),
+    'sma': lambda context, window: calculate_sma(context.data, window),
+    'vma': lambda context, window=20: calculate_vma(context.data, window),
+    'parabolic_sar': lambda context, step=0.02, max_step=0.2: parabolic_sar_array(
+        context.data['High'], context.data['Low'], context.data['Close'], step, max_step),
+    'bollinger_bands': lambda context, window=20, num_std_dev=2: calculate_bollinger_bands(
+        context.data, window, num_std_dev, context.get('sma', window=window)),
+    'stochastic_oscillator': lambda context, window=14, smooth_k=3, smooth_d=3: calculate_stochastic_oscillator(
+        context.data, window, smooth_k, smooth_d),
+    'true_range': lambda context: calculate_true_range(context.data),
+    'adx': lambda context, window=14: calculate_adx(context.data, window, context.get('true_range')),
+    'candlestick_codes': lambda context: candlestick_pattern_codes(context.data),
+    'swing_points': lambda context, lookback=5: swing_points(context.data, lookback),
+}
+
+def _as_float_type(result, dtype):
+    # Float Series and arrays of an indicator result as dtype, anything else (codes, masks) unchanged
+    if isinstance(result, tuple):
+        return tuple(_as_float_type(part, dtype) for part in result)
+    if isinstance(result, dict):
+        return {key: _as_float_type(part, dtype) for key, part in result.items()}
+    if isinstance(result, (pd.Series, np.ndarray)) and result.dtype.kind == 'f':
+        return result.astype(dtype, copy=False)
+    return result
+
+class IndicatorContext:
+    """
+    Indicator results of one frame, each computed the first time it is asked for and
+    reused after that. Results are keyed by name and parameters (defaults filled in),
+    so get('rsi') and get('rsi', window=14) are the same entry.
+
+    Only the OHLCV columns are read, so columns added to the frame afterwards do not
+    invalidate anything; a frame with different bars needs a new context.
+
+    :param dtype: Float type the results are stored as, np.float32 to halve their memory
+                  (default: as computed, float64). Later indicators are computed from the stored values.
+    """
+    _signatures = {}
+
+    def __init__(self, data, dtype=None):
+        self.data = data
+        self.dtype = dtype
+        self.results = {}
+        self.hits = {}
+
+    def _key(self, name, params):
+        signature = self._signatures.get(name)
+        if signature is None:
+            signature = self._signatures[name] = inspect.signature(INDICATOR_GRAPH[name])
+        bound = signature.bind(self, **params)
+        bound.apply_defaults()
+        return (name,) + tuple(sorted((key, value) for key, value in bound.arguments.items() if key != 'context'))
+
+    def get(self, name, **params):
+        key = self._key(name, params)
+        if key in self.results:
+            self.hits[key] = self.hits.get(key, 0) + 1
+            return self.results[key]
+
+        with profiling.stage(f'indicator {name}'):
+            result = INDICATOR_GRAPH[name](self, **params)
+        if self.dtype is not None:
+            result = _as_float_type(result, self.dtype)
+        self.results[key] = result
+        return result
+
+    def report(self):
+        """
+        :return: Dict of 'name(param=value, ...)' -> number of times the result was reused,
+                 for every indicator computed (each was computed once).
+        """
+        return {
+            f"{key[0]}({', '.join(f'{param}={value}' for param, value in key[1:])})": self.hits.get(key, 0)
+            for key in self.results
+        }
 
 
 def analyze_price_drop(data, drop_threshold=0.30):
@@ -429,3 +837,101 @@ def analyze_price_drop(data, drop_threshold=0.30):
     #     return f"Price is less than {drop_threshold * 100:.0f}% below the max high"
 
 
+# Panel indicators: the same calculations on wide frames (bars x tickers), so a whole
+# universe is one vectorized pass per indicator instead of one call per ticker.
+# Inputs are DataFrames with one column per ticker or 2-D arrays; results come back in the same form.
+
+def _panel(values):
+    if isinstance(values, pd.DataFrame):
+        return values
+    return pd.DataFrame(np.asarray(values, dtype=float))
+
+def _unpanel(result, like):
+    return result if isinstance(like, pd.DataFrame) else result.to_numpy()
+
+def panel_frame(frames, column):
+    """
+    Wide frame of one column (e.g. 'Close') from a dict of ticker -> OHLCV frame, aligned on the union of their bars.
+    """
+    return pd.DataFrame({ticker: frame[column] for ticker, frame in frames.items()})
+
+def panel_rsi(close, window=14):
+    panel = _panel(close)
+    delta = panel.diff(1)
+    gain = delta.where(delta > 0, 0)
+    loss = -delta.where(delta < 0, 0)
+
+    avg_gain = gain.rolling(window=window, min_periods=1).mean()
+    avg_loss = loss.rolling(window=window, min_periods=1).mean()
+
+    rs = avg_gain / avg_loss
+    return _unpanel(100 - (100 / (1 + rs)), close)
+
+def panel_ema(close, window):
+    return _unpanel(_panel(close).ewm(span=window, adjust=False).mean(), close)
+
+def panel_macd(close, fast_length=12, slow_length=26, signal_length=9):
+    panel = _panel(close)
+    macd_line = panel.ewm(span=fast_length, adjust=False).mean() - panel.ewm(span=slow_length, adjust=False).mean()
+    signal_line = macd_line.ewm(span=signal_length, adjust=False).mean()
+    macd_histogram = macd_line - signal_line
+    return _unpanel(macd_histogram, close), _unpanel(macd_line, close), _unpanel(signal_line, close)
+
+def panel_sma(close, window):
+    return _unpanel(_panel(close).rolling(window=window).mean(), close)
+
+def panel_vwap(high, low, close, volume):
+    volume_panel = _panel(volume)
+    typical_price = (_panel(high) + _panel(low) + _panel(close)) / 3
+    return _unpanel((typical_price * volume_panel).cumsum() / volume_panel.cumsum(), close)
+
+def panel_vma(volume, window=20):
+    return _unpanel(_panel(volume).rolling(window=window).mean(), volume)
+
+def panel_bollinger_bands(close, window=20, num_std_dev=2):
+    """
+    :return: Upper and lower Bollinger Bands, one column per ticker.
+    """
+    panel = _panel(close)
+    rolling_mean = panel.rolling(window).mean()
+    rolling_std = panel.rolling(window).std()
+    return _unpanel(rolling_mean + (rolling_std * num_std_dev), close), _unpanel(rolling_mean - (rolling_std * num_std_dev), close)
+
+def panel_stochastic_oscillator(high, low, close, window=14, smooth_k=3, smooth_d=3):
+    """
+    :return: %K and %D, one column per ticker.
+    """
+    low_min = _panel(low).rolling(window=window).min()
+    high_max = _panel(high).rolling(window=window).max()
+
+    stochastic_k = 100 * ((_panel(close) - low_min) / (high_max - low_min))
+    stochastic_k = stochastic_k.rolling(window=smooth_k).mean()
+    stochastic_d = stochastic_k.rolling(window=smooth_d).mean()
+    return _unpanel(stochastic_k, close), _unpanel(stochastic_d, close)
+
+def panel_adx(high, low, close, window=14):
+    high = _panel(high)
+    low = _panel(low)
+    close_panel = _panel(close)
+
+    plus_dm = high.diff()
+    minus_dm = low.diff()
+    plus_dm = plus_dm.where(~(plus_dm < 0), 0)
+    minus_dm = minus_dm.where(~(minus_dm > 0), 0)
+
+    # Same as combining with the built-in max in calculate_adx, NaN included
+    def larger(a, b):
+        return b.where(b > a, a)
+
+    tr1 = high - low
+    tr2 = (high - close_panel.shift(1)).abs()
+    tr3 = (low - close_panel.shift(1)).abs()
+    true_range = larger(larger(tr1, tr2), tr3)
+
+    atr = true_range.rolling(window=window).mean()
+
+    plus_di = 100 * (plus_dm.rolling(window=window).mean() / atr)
+    minus_di = 100 * (minus_dm.abs().rolling(window=window).mean() / atr)
+
+    dx = 100 * ((plus_di - minus_di).abs() / (plus_di + minus_di))
+    return _unpanel(dx.rolling(window=window).mean(), close)
@@ -0,0 +1,100 @@
+import re
+import pandas as pd
+
+# How a group of bars combines into one coarser bar; other columns keep their last value
+AGGREGATION = {
+    'Open': 'first',
+    'High': 'max',
+    'Low': 'min',
+    'Close': 'last',
+    'Adj Close': 'last',
+    'Volume': 'sum',
+}
+
+# Days of history yfinance serves for each intraday interval
+INTRADAY_RETENTION_DAYS = {
+    '1m': 7,
+    '2m': 60,
+    '5m': 60,
+    '15m': 60,
+    '30m': 60,
+    '60m': 730,
+    '90m': 60,
+    '1h': 730,
+}
+
+
+def interval_minutes(interval):
+    """
+    Length of a yfinance interval in minutes ('5m', '1h', '1d', '1wk').
+    """
+    match = re.fullmatch(r'(\d+)(m|h|d|wk)', interval)
+    if not match:
+        raise ValueError(f"Unsupported interval: {interval}")
+    count, unit = int(match.group(1)), match.group(2)
+    return count * {'m': 1, 'h': 60, 'd': 60 * 24, 'wk': 60 * 24 * 7}[unit]
+
+
+def is_intraday(interval):
+    return interval_minutes(interval) < 60 * 24
+
+
+def finest_interval(intervals):
+    return min(intervals, key=interval_minutes)
+
+
+def _bins(index, interval):
+    minutes = interval_minutes(interval)
+
+    if not is_intraday(interval):
+        # Calendar days (weeks starting on Monday) in the exchange time zone, as naive dates like yfinance daily bars
+        days = index.tz_localize(None).normalize() if index.tz is not None else index.normalize()
+        if interval == '1wk':
+            return days - pd.to_timedelta(days.dayofweek, unit='D')
+        if minutes != 60 * 24:
+            raise ValueError(f"Unsupported interval: {interval}")
+        return days
+
+    # Intraday bins start at every session's first bar (9:30 for US stocks, like yfinance hourly bars)
+    step = pd.Timedelta(minutes=minutes)
+    session_open = pd.DatetimeIndex(pd.Series(index).groupby(index.normalize()).transform('min'))
+    return session_open + (index - session_open) // step * step
+
+
+def resample_bars(bars, interval):
+    """
+    Coarser OHLCV bars built from finer ones: first open, highest high, lowest low, last close
+    and total volume of every group. Intraday groups are aligned on the session open and daily
+    bars follow the exchange calendar, so the bars line up with the ones yfinance returns.
+
+    :param interval: Target interval, coarser than the interval of bars.
+    """
+    if bars.empty:
+        return bars.copy()
+
+    aggregation = {column: AGGREGATION.get(column, 'last') for column in bars.columns}
+    resampled = bars.groupby(_bins(bars.index, interval), sort=True).agg(aggregation)
+
+    # Groups whose bars were all missing
+    resampled = resampled.dropna(subset=[column for column in ('Open', 'Close') if column in resampled.columns], how='all')
+    resampled.index.name = 'Datetime' if is_intraday(interval) else 'Date'
+    return resampled
+
+
+def stitch_bars(older, newer):
+    """
+    Bars of older up to the first bar of newer, followed by newer. Used to extend bars built
+    from intraday data with natively downloaded history beyond the intraday retention limit.
+    """
+    if older is None or older.empty:
+        return newer
+    if newer.empty:
+        return older
+
+    older_index = older.index
+    if (older_index.tz is None) != (newer.index.tz is None):
+        older_index = older_index.tz_localize(newer.index.tz) if older_index.tz is None else older_index.tz_localize(None)
+        older = older.set_axis(older_index)
+
+    older = older[older.index < newer.index[0]]
+    return pd.concat([older, newer])